@@ -1,3 +1,3 @@
-from .waypanel_settings import main
+from .cli import main
 
 __all__ = ['main']
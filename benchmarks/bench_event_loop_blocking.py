@@ -0,0 +1,120 @@
+"""
+Histogram of event-loop stalls with config I/O inline vs. in the thread pool.
+
+Drives the Quart app in-process against a synthetic config while a ticker
+coroutine measures how late the event loop wakes it up. Every request sees a
+freshly touched config file, so each one pays a full parse, and every fifth
+request also saves. The run is repeated with OFFLOAD_IO off and on.
+
+Disk waits (open, read, fsync, rename) release the GIL, so they disappear
+from the loop entirely once offloaded. Parsing is CPU work: a pure-Python
+reader yields the GIL every few milliseconds, while a compiled tomli holds it
+for the whole parse, so compare --reader tomllib and --reader tomli.
+
+    python benchmarks/bench_event_loop_blocking.py
+    python benchmarks/bench_event_loop_blocking.py --entries 50000 --requests 40 --reader tomllib
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import toml_codec  # noqa: E402
+from bench_toml_codec import synthetic_config  # noqa: E402
+
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+TICK = 0.001
+
+
+def import_app():
+    """Import the package from this checkout whatever its directory is called"""
+    spec = importlib.util.spec_from_file_location(
+        'waypanel_settings', os.path.join(ROOT, '__init__.py'), submodule_search_locations=[ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules['waypanel_settings'] = package
+    spec.loader.exec_module(package)
+    return importlib.import_module('waypanel_settings.waypanel_settings')
+
+
+async def measure(ws, config_path, requests):
+    stalls = []
+    running = True
+
+    async def ticker():
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            stalls.append(time.perf_counter() - start - TICK)
+
+    client = ws.app.test_client()
+    tick_task = asyncio.ensure_future(ticker())
+    start = time.perf_counter()
+    for i in range(requests):
+        # New mtime, so the cache has to re-parse
+        os.utime(config_path, ns=(time.time_ns(), time.time_ns()))
+        ws._config_cache.invalidate()
+        await client.get('/')
+        if i % 5 == 0:
+            await client.post('/folders/add', form={
+                'id': f'bench{i}', 'name': 'Bench', 'path': '/tmp', 'filemanager': 'true', 'icon': 'folder'})
+            await ws._config_writer.flush()
+    elapsed = time.perf_counter() - start
+    running = False
+    await tick_task
+    return stalls, elapsed
+
+
+def print_histogram(label, stalls, elapsed):
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for stall in stalls:
+        ms = stall * 1000
+        index = next((i for i, bound in enumerate(BUCKETS_MS) if ms < bound), len(BUCKETS_MS))
+        counts[index] += 1
+
+    ordered = sorted(stalls)
+    p99 = ordered[int(len(ordered) * 0.99)] * 1000 if ordered else 0
+    blocked = sum(s for s in stalls if s * 1000 >= BUCKETS_MS[0])
+    print(f"\n{label}: {len(stalls)} ticks in {elapsed:.2f}s, p99 {p99:.1f}ms, "
+          f"max {max(stalls, default=0) * 1000:.1f}ms, {blocked * 1000:.0f}ms spent in stalls >= 1ms")
+
+    widest = max(counts) or 1
+    lower = 0
+    for i, count in enumerate(counts):
+        upper = f"{BUCKETS_MS[i]}ms" if i < len(BUCKETS_MS) else 'inf'
+        bar = '#' * max(1 if count else 0, count * 40 // widest)
+        print(f"  {lower:>4}-{upper:<6} {count:>6} {bar}")
+        lower = BUCKETS_MS[i] if i < len(BUCKETS_MS) else lower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--reader', choices=toml_codec.available_readers())
+    args = parser.parse_args()
+    toml_codec.set_backend(reader=args.reader)
+
+    ws = import_app()
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, 'waypanel.toml')
+        with open(config_path, 'w') as f:
+            f.write(toml_codec.dumps(synthetic_config(args.entries)))
+        print(f"config: {args.entries} entries, {os.path.getsize(config_path) // 1024}KB, "
+              f"reader: {toml_codec.reader_name()}")
+
+        ws.app.config['CONFIG_PATH'] = config_path
+        ws.app.config['SAVE_DELAY'] = 0
+        for offload in (False, True):
+            ws.app.config['OFFLOAD_IO'] = offload
+            stalls, elapsed = asyncio.run(measure(ws, config_path, args.requests))
+            print_histogram('thread pool' if offload else 'inline', stalls, elapsed)
+
+
+if __name__ == '__main__':
+    main()
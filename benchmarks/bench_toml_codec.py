@@ -0,0 +1,102 @@
+"""
+Time config load+save for every available TOML backend pair.
+
+Builds synthetic waypanel configs with dockbar apps, menu items and folders
+in the same shapes the settings app writes, then times toml_codec.loads and
+toml_codec.dumps for each reader/writer combination.
+
+    python benchmarks/bench_toml_codec.py
+    python benchmarks/bench_toml_codec.py --sizes 1000 10000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import toml_codec  # noqa: E402
+
+
+def synthetic_config(entries):
+    """Split entries roughly 50/40/10 between dockbar, menu items and folders"""
+    dockbar_count = entries // 2
+    menu_count = entries * 2 // 5
+    folder_count = entries - dockbar_count - menu_count
+
+    menu = {'icons': {f'Submenu{i}': f'icon-{i}' for i in range(max(1, menu_count // 20))}}
+    for i in range(menu_count):
+        submenu = menu.setdefault(f'Submenu{i // 20}', {})
+        submenu[f'item_{i % 20 + 1}'] = {'name': f'Item {i}', 'cmd': f'run-item --id {i}'}
+
+    return {
+        'panel': {
+            'top': {'enabled': True, 'height': 32, 'layer': 'top', 'exclusive_zone': True},
+            'bottom': {'enabled': False, 'height': 48, 'opacity': 0.9},
+        },
+        'dockbar': {
+            f'app{i}': {
+                'cmd': f'app{i} --new-window',
+                'icon': f'app{i}',
+                'wclass': f'org.example.App{i}',
+                'desktop_file': f'org.example.App{i}.desktop',
+                'name': f'Application "{i}"',
+            }
+            for i in range(dockbar_count)
+        },
+        'menu': menu,
+        'folders': {
+            f'folder{i}': {
+                'name': f'Folder {i}',
+                'path': f'/home/user/folder{i}',
+                'filemanager': 'nautilus',
+                'icon': 'folder',
+            }
+            for i in range(folder_count)
+        },
+    }
+
+
+def best_of(repeat, func, *args):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    readers = toml_codec.available_readers()
+    writers = toml_codec.available_writers()
+    print(f"readers: {', '.join(readers)}")
+    print(f"writers: {', '.join(writers)}")
+    print(f"default: {toml_codec.reader_name()} + {toml_codec.writer_name()}\n")
+
+    print(f"{'entries':>8} {'size':>9} {'reader':>8} {'writer':>8} "
+          f"{'load ms':>9} {'save ms':>9} {'total ms':>9} {'stable':>6}")
+    for entries in args.sizes:
+        config = synthetic_config(entries)
+        toml_codec.set_backend(writer='builtin')
+        text = toml_codec.dumps(config)
+
+        for reader in readers:
+            toml_codec.set_backend(reader=reader)
+            load_time, loaded = best_of(args.repeat, toml_codec.loads, text)
+            for writer in writers:
+                toml_codec.set_backend(writer=writer)
+                save_time, saved = best_of(args.repeat, toml_codec.dumps, loaded)
+                stable = toml_codec.dumps(toml_codec.loads(saved)) == saved
+                print(f"{entries:>8} {len(text) // 1024:>7}KB {reader:>8} {writer:>8} "
+                      f"{load_time * 1000:>9.1f} {save_time * 1000:>9.1f} "
+                      f"{(load_time + save_time) * 1000:>9.1f} {'yes' if stable else 'no':>6}")
+
+
+if __name__ == '__main__':
+    main()
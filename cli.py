@@ -0,0 +1,204 @@
+"""
+Command line entry point for waypanel-settings.
+
+Without a subcommand the settings window is started. The headless
+subcommands only import the config layer (core and toml_codec), so scripted
+edits don't pay for booting quart, hypercorn and webview:
+
+    waypanel-settings get panel.top.height
+    waypanel-settings set panel.top.height 32
+    waypanel-settings list dockbar
+    waypanel-settings export --section dockbar -o dock.jsonl
+    waypanel-settings import --replace dockbar dock.jsonl
+"""
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import sys
+
+from . import core, toml_codec
+
+
+class StartupTimer:
+    """Collects startup milestones for --startup-timing"""
+
+    def __init__(self, start):
+        self.start = start
+        self.last = start
+        self.marks = []
+
+    def mark(self, label):
+        now = time.perf_counter()
+        self.marks.append((label, now - self.last))
+        self.last = now
+
+    def report(self):
+        for label, elapsed in self.marks:
+            print(f"{label:<20} {elapsed * 1000:8.1f} ms")
+        print(f"{'total':<20} {(self.last - self.start) * 1000:8.1f} ms")
+
+
+# ======================
+# Headless Commands
+# ======================
+
+
+def read(args):
+    # One-shot commands never read the file twice, so skip the watcher
+    return core.read_config(args.config, watch=False)
+
+
+def cmd_get(args):
+    config = read(args)
+    value = core.get_key(config, args.key)
+    if isinstance(value, dict):
+        print(toml_codec.dumps(value), end='')
+    else:
+        print(toml_codec.format_value(value))
+
+
+def cmd_set(args):
+    config = read(args)
+    value = args.value if args.string else core.convert_value_type(args.value)
+    core.set_key(config, args.key, value)
+    core.write_config(args.config, config)
+
+
+def cmd_unset(args):
+    config = read(args)
+    core.delete_key(config, args.key)
+    core.write_config(args.config, config)
+
+
+def cmd_list(args):
+    config = read(args)
+    value = core.get_key(config, args.key) if args.key else config
+    if isinstance(value, dict):
+        for key in value:
+            print(key)
+    elif isinstance(value, list):
+        for item in value:
+            print(toml_codec.format_value(item))
+    else:
+        raise KeyError(args.key)
+
+
+def cmd_clean(args):
+    removed = core.clean_config(args.config, dry_run=args.dry_run, watch=False)
+    verb = 'would remove' if args.dry_run else 'removed'
+    for name in removed:
+        print(f"{verb} [{name}]")
+
+
+def transfer_format(args, path):
+    if args.format:
+        return args.format
+    return 'toml' if path and path.endswith('.toml') else 'jsonl'
+
+
+def cmd_export(args):
+    config = read(args)
+    entries = core.config_entries(config, tuple(args.section or core.TRANSFER_SECTIONS))
+    parts = core.dump_entries(entries, transfer_format(args, args.output))
+    if args.output in (None, '-'):
+        sys.stdout.writelines(parts)
+    else:
+        with open(args.output, 'w') as f:
+            f.writelines(parts)
+
+
+def cmd_import(args):
+    config = read(args)
+    replace = tuple(args.replace or ())
+    sections = tuple(args.section or core.TRANSFER_SECTIONS)
+    # Replacing a section imports it
+    sections += tuple(name for name in replace if name not in sections)
+    fmt = transfer_format(args, args.file)
+    if args.file == '-':
+        counts = core.import_entries(config, core.read_entries(sys.stdin, fmt, sections), replace)
+    else:
+        with open(args.file) as f:
+            counts = core.import_entries(config, core.read_entries(f, fmt, sections), replace)
+    core.write_config(args.config, config)
+    for name in sections:
+        print(f"imported {counts[name]} {name} entries")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='waypanel-settings', description='Waypanel settings editor')
+    parser.add_argument('--startup-timing', action='store_true',
+                        help='print time spent in each startup phase up to the first paint')
+    parser.add_argument('--config', default=core.CONFIG_PATH,
+                        help='config file to edit (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    get = commands.add_parser('get', help='print a value or table, e.g. panel.top.height')
+    get.add_argument('key')
+    get.set_defaults(func=cmd_get)
+
+    set_ = commands.add_parser('set', help='set a value, creating missing tables')
+    set_.add_argument('key')
+    set_.add_argument('value')
+    set_.add_argument('--string', action='store_true',
+                      help='store VALUE as a string instead of guessing its type')
+    set_.set_defaults(func=cmd_set)
+
+    unset = commands.add_parser('unset', help='remove a key or table')
+    unset.add_argument('key')
+    unset.set_defaults(func=cmd_unset)
+
+    list_ = commands.add_parser('list', help='list the keys of a table, or the top-level tables')
+    list_.add_argument('key', nargs='?')
+    list_.set_defaults(func=cmd_list)
+
+    clean = commands.add_parser('clean', help='remove empty orphaned sections and submenus')
+    clean.add_argument('--dry-run', action='store_true',
+                       help='only list the sections that would be removed')
+    clean.set_defaults(func=cmd_clean)
+
+    export = commands.add_parser('export', help='write dockbar apps, folders and menu items out')
+    export.add_argument('-o', '--output', help='file to write (default: stdout)')
+    export.add_argument('--format', choices=core.TRANSFER_FORMATS,
+                        help='output format (default: toml for a .toml file, else jsonl)')
+    export.add_argument('--section', action='append', choices=core.TRANSFER_SECTIONS,
+                        help='section to export, can be repeated (default: all)')
+    export.set_defaults(func=cmd_export)
+
+    import_ = commands.add_parser('import', help='merge entries written by export into the config')
+    import_.add_argument('file', nargs='?', default='-', help='file to read (default: stdin)')
+    import_.add_argument('--format', choices=core.TRANSFER_FORMATS,
+                         help='input format (default: toml for a .toml file, else jsonl)')
+    import_.add_argument('--section', action='append', choices=core.TRANSFER_SECTIONS,
+                         help='only import this section, can be repeated (default: all)')
+    import_.add_argument('--replace', action='append', choices=core.TRANSFER_SECTIONS,
+                         help='replace this section with the imported entries instead of merging')
+    import_.set_defaults(func=cmd_import)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command is None:
+        timer = StartupTimer(_START) if args.startup_timing else None
+        from .waypanel_settings import app, main as run_gui
+        app.config['CONFIG_PATH'] = args.config
+        return run_gui(timer)
+
+    try:
+        args.func(args)
+    except KeyError as e:
+        print(f"waypanel-settings: no such key: {e.args[0]}", file=sys.stderr)
+        return 1
+    except toml_codec.TOMLDecodeError as e:
+        print(f"waypanel-settings: {args.config}: {e}", file=sys.stderr)
+        return 1
+    except core.TransferError as e:
+        print(f"waypanel-settings: import: {e}", file=sys.stderr)
+        return 1
+    except OSError as e:
+        print(f"waypanel-settings: {e.filename or args.config}: {e.strerror or e}", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,2027 @@
+"""
+Config layer for waypanel-settings.
+
+Everything needed to read, edit and write waypanel.toml without the web UI:
+the parsed-config cache, copy-on-write views and section splicing. Only the
+standard library and toml_codec are imported here, so the headless CLI can
+use it without loading quart, hypercorn or webview.
+"""
+import bisect
+import ctypes
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, time
+
+from . import toml_codec
+
+CONFIG_PATH = os.path.expanduser('~/.config/waypanel/waypanel.toml')
+
+
+def default_config():
+    """Config used when waypanel.toml doesn't exist yet"""
+    return {
+        'panel': {},
+        'menu': {'icons': {}},
+        'folders': {},
+        'dockbar': {},
+        'cmd': {},
+        'launcher': {}
+    }
+
+
+PROTECTED_SECTIONS = {
+    'panel', 'menu', 'folders', 'dockbar',
+    'cmd', 'launcher', 'dpms'
+}
+
+
+def find_orphaned_sections(config):
+    """Empty [prefix.suffix] sections outside the known tables"""
+    return [name for name in config
+            if '.' in name and name.split('.')[0] not in PROTECTED_SECTIONS and not config[name]]
+
+
+def clean_orphaned_sections(config):
+    """Remove orphaned sections in place and return their names"""
+    orphans = find_orphaned_sections(config)
+    for name in orphans:
+        del config[name]
+    return orphans
+
+
+# ======================
+# Config Cache
+# ======================
+
+
+_MISSING = object()
+
+
+class ConfigView(dict):
+    """
+    Copy-on-write view of a cached config table.
+
+    Holds a shallow copy of the table it wraps. Nested tables are wrapped the
+    same way the first time they are reached and the same view is handed
+    out after that, so a route only copies the tables it actually walks
+    into, once, and the cached tree is never mutated. A view layered on
+    another one (a different ``dirty`` set) wraps that one's tables again.
+    Every mutation records its key path in the shared ``dirty`` set, which
+    lets save_config() re-emit only the sections that changed.
+
+    ``_source`` is the table a view copies. A submenu's view also carries
+    its own item index once asked for one (see submenu_items()), kept in
+    step as keys come and go; False means its keys changed before it had
+    one.
+    """
+
+    __slots__ = ('_dirty', '_path', '_base', '_source', '_items')
+
+    def __init__(self, table=(), dirty=None, path=(), base=None):
+        super().__init__(table)
+        self._dirty = dirty
+        self._path = path
+        self._base = base
+        self._source = table if isinstance(table, dict) else None
+        self._items = None
+
+    def _touch(self, key):
+        if self._dirty is not None:
+            self._dirty.add(self._path + (key,))
+
+    def _rekey(self, key, old, new):
+        """Keep the item index in step when key goes from old to new (_MISSING if absent)"""
+        was = old is not _MISSING and isinstance(old, dict)
+        now = new is not _MISSING and isinstance(new, dict)
+        if was == now and (old is _MISSING) == (new is _MISSING):
+            return
+        if not self._items:
+            self._items = False
+            return
+        if old is not _MISSING:
+            self._items.discard(key)
+        if new is not _MISSING:
+            self._items.add(key, now)
+
+    def _wrap(self, key, value):
+        if isinstance(value, dict):
+            path = self._path + (key,)
+            if (isinstance(value, ConfigView) and self._dirty is not None
+                    and value._dirty is self._dirty and value._path == path):
+                # Already wrapped by this view
+                return value
+            value = ConfigView(value, self._dirty, path)
+            dict.__setitem__(self, key, value)
+        elif type(value) is list:
+            # List edits can't be tracked, so handing one out counts as a change
+            value = [ConfigView(v) if isinstance(v, dict) else v for v in value]
+            dict.__setitem__(self, key, value)
+            self._touch(key)
+        return value
+
+    def __getitem__(self, key):
+        return self._wrap(key, dict.__getitem__(self, key))
+
+    def __setitem__(self, key, value):
+        old = dict.get(self, key, _MISSING)
+        value = _adopt(value)
+        dict.__setitem__(self, key, value)
+        self._rekey(key, old, value)
+        self._touch(key)
+
+    def __delitem__(self, key):
+        old = dict.__getitem__(self, key)
+        dict.__delitem__(self, key)
+        self._rekey(key, old, _MISSING)
+        self._touch(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            self._rekey(key, dict.__getitem__(self, key), _MISSING)
+            self._touch(key)
+        value = dict.pop(self, key, *default)
+        return _adopt(value)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self._rekey(key, value, _MISSING)
+        self._touch(key)
+        return key, _adopt(value)
+
+    def clear(self):
+        for key in self:
+            self._touch(key)
+        dict.clear(self)
+        self._items = False
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def values(self):
+        return [self[key] for key in self]
+
+
+def _adopt(value):
+    """Wrap plain dicts built by a route so the view tree stays private"""
+    if type(value) is dict:
+        return ConfigView({k: _adopt(v) for k, v in value.items()})
+    if type(value) is list:
+        return [_adopt(v) for v in value]
+    return value
+
+
+def _freeze(value):
+    """Turn a view tree back into plain dicts, sharing untouched tables"""
+    if isinstance(value, ConfigView):
+        return {k: _freeze(v) for k, v in dict.items(value)}
+    if type(value) is list:
+        return [_freeze(v) for v in value]
+    return value
+
+
+def _share_keys(value):
+    """
+    Rebuild a parsed tree with interned keys. The parser gives every table
+    its own copy of each key, so a big config holds thousands of 'name'
+    and 'cmd' strings; afterwards each table refers to one of them.
+    """
+    if type(value) is dict:
+        return {sys.intern(k): _share_keys(v) for k, v in value.items()}
+    if type(value) is list:
+        return [_share_keys(v) for v in value]
+    return value
+
+
+def _file_key(st):
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+# Tables whose sub-tables are saved independently, e.g. [menu.VPN]
+SPLIT_SECTIONS = {'menu'}
+
+_TOKEN_RE = re.compile(r'"""|\'\'\'|"(?:[^"\\\n]|\\.)*"|\'[^\'\n]*\'|#[^\n]*|[\[\]{}\n]')
+_HEADER_START_RE = re.compile(r'[ \t]*(\[\[?)')
+_KEY_PART_RE = re.compile(r'[ \t]*(?:([A-Za-z0-9_-]+)|"((?:[^"\\\n]|\\.)*)"|\'([^\'\n]*)\')[ \t]*')
+_ESCAPE_RE = re.compile(r'\\(?:U([0-9A-Fa-f]{8})|u([0-9A-Fa-f]{4})|(.))')
+_ESCAPES = {'b': '\b', 't': '\t', 'n': '\n', 'f': '\f', 'r': '\r', '"': '"', '\\': '\\'}
+_VALUE_LINE_RE = re.compile(r'^[ \t]*[^\s#\[]', re.M)
+
+
+def _unescape(value):
+    def replace(match):
+        code = match.group(1) or match.group(2)
+        return chr(int(code, 16)) if code else _ESCAPES[match.group(3)]
+    return _ESCAPE_RE.sub(replace, value)
+
+
+def _header_path(line):
+    """Key path of a [table] or [[array]] header line, or None if malformed"""
+    match = _HEADER_START_RE.match(line)
+    if match is None:
+        return None
+    close = ']' * len(match.group(1))
+    pos = match.end()
+
+    path = []
+    while True:
+        part = _KEY_PART_RE.match(line, pos)
+        if part is None:
+            return None
+        bare, basic, literal = part.groups()
+        try:
+            path.append(bare if bare is not None else _unescape(basic) if basic is not None else literal)
+        except KeyError:
+            return None
+        pos = part.end()
+        if not line.startswith('.', pos):
+            break
+        pos += 1
+
+    if not line.startswith(close, pos):
+        return None
+    rest = line[pos + len(close):].strip()
+    if rest and not rest.startswith('#'):
+        return None
+    return tuple(path)
+
+
+def _section_unit(path):
+    if path[0] in SPLIT_SECTIONS and len(path) > 1:
+        return path[:2]
+    return path[:1]
+
+
+def _multiline_end(text, pos, delim):
+    while True:
+        end = text.find(delim, pos)
+        if end < 0:
+            return -1
+        if delim == '"""':
+            backslashes = len(text[pos:end]) - len(text[pos:end].rstrip('\\'))
+            if backslashes % 2:
+                pos = end + 1
+                continue
+        end += 3
+        # Up to two quotes may sit right before the closing delimiter
+        for _ in range(2):
+            if end < len(text) and text[end] == delim[0]:
+                end += 1
+        return end
+
+
+def split_sections(text):
+    """
+    Split a TOML document into (unit, text) chunks at table headers.
+
+    The unit of a chunk is the top-level table it belongs to, or
+    (table, sub) for SPLIT_SECTIONS. Leading comments form a chunk with unit
+    None. Returns None when the document can't be split safely, e.g. when it
+    has top-level keys outside any table.
+    """
+    starts = []
+    depth = 0
+    pos = 0
+    at_line_start = True
+    while True:
+        if at_line_start and depth == 0 and _HEADER_START_RE.match(text, pos):
+            eol = text.find('\n', pos)
+            eol = len(text) if eol < 0 else eol
+            path = _header_path(text[pos:eol])
+            if path is None:
+                return None
+            starts.append((pos, _section_unit(path)))
+            pos = eol
+
+        match = _TOKEN_RE.search(text, pos)
+        if match is None:
+            break
+        token = match.group()
+        pos = match.end()
+        at_line_start = token == '\n'
+        if token in ('"""', "'''"):
+            pos = _multiline_end(text, pos, token)
+            if pos < 0:
+                return None
+        elif token in ('[', '{'):
+            depth += 1
+        elif token in (']', '}'):
+            depth -= 1
+
+    preamble = text[:starts[0][0]] if starts else text
+    if _VALUE_LINE_RE.search(preamble):
+        return None
+
+    chunks = [(None, preamble)] if preamble else []
+    for i, (start, unit) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(text)
+        chunks.append((unit, text[start:end]))
+    return chunks
+
+
+def _is_table(value):
+    if isinstance(value, dict):
+        return True
+    return isinstance(value, list) and bool(value) and all(isinstance(v, dict) for v in value)
+
+
+def _dirty_regions(config, base, chunks):
+    """
+    Collapse the view's dirty key paths into the units that must be re-emitted.
+
+    Returns None if a change can't be expressed as whole units, which makes
+    the caller fall back to a full rewrite.
+    """
+    # A [menu] header carrying its own keys can't be split per submenu
+    coarse = {unit[0] for unit, text in chunks
+              if unit is not None and len(unit) == 1 and unit[0] in SPLIT_SECTIONS
+              and _VALUE_LINE_RE.search(text.partition('\n')[2])}
+
+    regions = {}
+    for path in config._dirty:
+        key = path[0]
+        parent = dict.get(config, key)
+        # The parent table itself comes or goes when it is created or emptied
+        if (key in SPLIT_SECTIONS and len(path) > 1 and key not in coarse and
+                isinstance(base.get(key), dict) and parent):
+            old = base[key].get(path[1])
+            new = dict.get(parent, path[1]) if isinstance(parent, dict) else None
+            if all(v is None or _is_table(v) for v in (old, new)):
+                regions[path[:2]] = None
+                continue
+        for value in (base.get(key), dict.get(config, key)):
+            if value is not None and not _is_table(value):
+                return None
+        regions[(key,)] = None
+
+    return [r for r in regions if len(r) == 1 or (r[0],) not in regions]
+
+
+def _region_chunks(config, region):
+    value = config
+    for key in region:
+        if not isinstance(value, dict) or key not in value:
+            return []
+        value = dict.__getitem__(value, key)
+    for key in reversed(region):
+        value = {key: value}
+    return split_sections(toml_codec.dumps(value))
+
+
+def _splice_sections(chunks, regions, config):
+    """Rebuild the chunk list with dirty regions re-emitted in place, or None"""
+    lookup = set(regions)
+    emitted = set()
+    out = []
+    last_fresh = False
+
+    def append(chunk, fresh):
+        # Keep a blank line on either side of re-emitted sections
+        nonlocal last_fresh
+        if out and (fresh or last_fresh) and not out[-1][1].endswith('\n\n'):
+            unit, text = out[-1]
+            out[-1] = (unit, text + ('\n' if text.endswith('\n') else '\n\n'))
+        out.append(chunk)
+        last_fresh = fresh
+
+    for chunk in chunks:
+        unit = chunk[0]
+        if unit is None:
+            append(chunk, False)
+            continue
+        region = unit[:1] if unit[:1] in lookup else unit[:2] if unit[:2] in lookup else None
+        if region is None:
+            # Sections dropped by clean_orphaned_sections stay dropped
+            if unit[0] in config:
+                append(chunk, False)
+            continue
+        if region not in emitted:
+            emitted.add(region)
+            fresh_chunks = _region_chunks(config, region)
+            if fresh_chunks is None:
+                return None
+            for fresh in fresh_chunks:
+                append(fresh, True)
+
+    for region in regions:
+        if region not in emitted:
+            fresh_chunks = _region_chunks(config, region)
+            if fresh_chunks is None:
+                return None
+            for fresh in fresh_chunks:
+                append(fresh, True)
+
+    if out and out[-1][1].endswith('\n\n'):
+        unit, text = out[-1]
+        out[-1] = (unit, text.rstrip('\n') + '\n')
+    return out
+
+
+class ConfigWatcher(threading.Thread):
+    """Marks the config cache stale on inotify events for the config file"""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_OPEN = 0x00000020
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    EVENT_HEADER = struct.Struct('iIII')
+    _libc = None
+
+    def __init__(self, path, on_change):
+        super().__init__(name='ConfigWatcher', daemon=True)
+        self.path = path
+        self.filename = os.fsencode(os.path.basename(path))
+        self.on_change = on_change
+        self.alive = False
+
+        libc = self.libc()
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        directory = os.fsencode(os.path.dirname(path))
+        if libc.inotify_add_watch(self.fd, directory, self.WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f'inotify_add_watch failed for {path}')
+
+    @classmethod
+    def libc(cls):
+        if cls._libc is None:
+            # find_library pulls in subprocess and friends, only pay for it here
+            import ctypes.util
+            cls._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        return cls._libc
+
+    def start(self):
+        self.alive = True
+        super().start()
+
+    def run(self):
+        try:
+            while self.alive:
+                data = os.read(self.fd, 64 * 1024)
+                offset = 0
+                while offset < len(data):
+                    _, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                    offset += self.EVENT_HEADER.size
+                    name = data[offset:offset + length].rstrip(b'\0')
+                    offset += length
+
+                    if mask & (self.IN_IGNORED | self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                        # The directory itself went away, nothing left to watch
+                        self.alive = False
+                    if name == self.filename or mask & self.IN_Q_OVERFLOW or not self.alive:
+                        self.on_change(self.path)
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"Config watcher stopped: {e}")
+        finally:
+            self.alive = False
+            self.on_change(self.path)
+            os.close(self.fd)
+
+
+def watch_opens(path):
+    """
+    Non-blocking inotify fd that turns readable once path is opened, e.g.
+    to see a process re-read the config. The caller closes it.
+    """
+    libc = ConfigWatcher.libc()
+    fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+    if libc.inotify_add_watch(fd, os.fsencode(path), ConfigWatcher.IN_OPEN) < 0:
+        errno = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(errno, f'inotify_add_watch failed for {path}')
+    return fd
+
+
+class ConfigCache:
+    """
+    Process-wide parsed config, keyed on the file's (inode, mtime_ns, size).
+
+    While the inotify watcher is running a warm cache is served without
+    touching the disk at all; any event for the file marks it stale and the
+    next load re-checks the key. Without a watcher every load does one
+    fstat() and only re-parses when the key changed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.path = None
+        self.key = None
+        self.config = None
+        self.text = None
+        self.chunks = None
+        self.stale = True
+        self.watcher = None
+        # Sections clean_orphaned_sections dropped from the cached config
+        # but that are still in the file
+        self.orphans = []
+        # (table, SubmenuItems) per submenu of self.config
+        self.submenus = {}
+        # Data derived from self.config (menu model, listings), built on first use
+        self.views = {}
+        # Called with the path from the watcher thread whenever the file changes
+        self.listeners = []
+        # (path, key) of the file as store() last wrote it
+        self.written = None
+
+    def _watching(self):
+        return self.watcher is not None and self.watcher.alive and self.watcher.path == self.path
+
+    def _start_watcher(self):
+        try:
+            self.watcher = ConfigWatcher(self.path, self.invalidate)
+            self.watcher.start()
+        except (OSError, AttributeError) as e:
+            logging.getLogger(__name__).debug(f"Config watcher unavailable, falling back to stat: {e}")
+            self.watcher = None
+
+    def invalidate(self, path=None):
+        with self.lock:
+            if path is None or path == self.path:
+                self.stale = True
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener(path)
+
+    def add_listener(self, callback):
+        with self.lock:
+            self.listeners.append(callback)
+
+    def own_write(self, path):
+        """True if the file at path is still exactly as this process last wrote it"""
+        try:
+            key = _file_key(os.stat(path))
+        except FileNotFoundError:
+            return False
+        with self.lock:
+            return self.written == (path, key)
+
+    def mtime(self, path):
+        """The file's mtime, from the cache key while the watcher vouches for it"""
+        with self.lock:
+            if path == self.path and self._watching() and not self.stale and self.key is not None:
+                return self.key[1] / 1e9
+        try:
+            return os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def peek(self, path):
+        """Cached config if it can be served without touching the disk"""
+        with self.lock:
+            if path == self.path and self._watching() and not self.stale:
+                return self.config
+            return None
+
+    def view(self, config, name, build):
+        """build(config), computed once per cached config and shared after that"""
+        with self.lock:
+            if config is self.config and name in self.views:
+                return self.views[name]
+        # Built unlocked, builders may take the lock themselves
+        value = build(config)
+        with self.lock:
+            if config is self.config:
+                self.views[name] = value
+        return value
+
+    def submenu_items(self, name, table):
+        """
+        Item index of a plain submenu table, shared while table is the
+        cached config's. Never changed in place: views edit copies.
+        """
+        with self.lock:
+            entry = self.submenus.get(name)
+            if entry is not None and entry[0] is table:
+                return entry[1]
+            index = SubmenuItems(table)
+            menu = dict.get(self.config, 'menu') if self.config is not None else None
+            if isinstance(menu, dict) and dict.get(menu, name) is table:
+                self.submenus[name] = (table, index)
+            return index
+
+    def load(self, path, watch=True):
+        with self.lock:
+            if path != self.path:
+                self.path, self.key, self.config, self.stale = path, None, None, True
+                self.text = self.chunks = None
+                self.orphans = []
+                self.submenus = {}
+                self.views = {}
+            if not self._watching():
+                if watch:
+                    self._start_watcher()
+            elif not self.stale and self.config is not None:
+                return self.config
+
+            with open(path, 'r') as f:
+                key = _file_key(os.fstat(f.fileno()))
+                if key != self.key or self.config is None:
+                    self.text = f.read()
+                    self.chunks = None
+                    config = _share_keys(toml_codec.loads(self.text))
+                    self.orphans = clean_orphaned_sections(config)
+                    self.config = config
+                    self.key = key
+                    self.submenus = {}
+                    self.views = {}
+            self.stale = False
+            return self.config
+
+    def render(self, path, config):
+        """
+        Serialize config for writing to path, returning (text, chunks).
+
+        When config is a view of the current file image and the file hasn't
+        changed underneath it, only the dirty sections are serialized and the
+        rest of the file is spliced in verbatim. Otherwise the whole document
+        is dumped and chunks is None.
+        """
+        with self.lock:
+            chunks = self._splice(path, config)
+        if chunks is None:
+            return toml_codec.dumps(config), None
+        return ''.join(text for _, text in chunks), chunks
+
+    def _splice(self, path, config):
+        if (not isinstance(config, ConfigView) or config._base is None or
+                config._base is not self.config or path != self.path):
+            return None
+        try:
+            if _file_key(os.stat(path)) != self.key:
+                return None
+        except FileNotFoundError:
+            return None
+
+        if self.chunks is None:
+            # False marks an image we already failed to split
+            self.chunks = split_sections(self.text or '') or False
+        if not self.chunks:
+            return None
+
+        regions = _dirty_regions(config, self.config, self.chunks)
+        if regions is None:
+            return None
+        return _splice_sections(self.chunks, regions, config)
+
+    def current(self, path):
+        """(text, config) of the file at path if the cache still matches it"""
+        with self.lock:
+            if path != self.path or self.config is None:
+                return None
+            try:
+                if _file_key(os.stat(path)) != self.key:
+                    return None
+            except FileNotFoundError:
+                return None
+            text = self.text if self.text is not None else ''.join(text for _, text in self.chunks or ())
+            return text, self.config
+
+    def unchanged(self, path, config):
+        """True if writing config to path would reproduce the file as it is"""
+        with self.lock:
+            if (not isinstance(config, ConfigView) or config._base is None or
+                    config._base is not self.config or path != self.path or self.orphans):
+                return False
+            try:
+                if _file_key(os.stat(path)) != self.key:
+                    return False
+            except FileNotFoundError:
+                return False
+            base = self.config
+        return same_config(base, config)
+
+    def store(self, path, config, text=None, chunks=None):
+        """Adopt a just-written config as the cached version of the file"""
+        with self.lock:
+            self.path = path
+            self.config = _freeze(config)
+            self.orphans = clean_orphaned_sections(self.config)
+            self.submenus = {}
+            self.views = {}
+            self.text = text
+            self.chunks = chunks
+            self.key = _file_key(os.stat(path))
+            self.written = (path, self.key)
+            self.stale = False
+
+
+_config_cache = ConfigCache()
+
+
+def read_config(path=CONFIG_PATH, watch=True):
+    """
+    Editable view of the config at path.
+
+    watch=False skips starting the inotify watcher, for one-shot callers
+    such as the CLI that never read the file twice.
+    """
+    try:
+        config = _config_cache.load(path, watch)
+        return ConfigView(config, dirty=set(), base=config)
+    except FileNotFoundError:
+        return ConfigView(default_config(), dirty=set())
+
+
+def write_config(path, config):
+    """Write config to path; returns False if the save was a no-op and skipped"""
+    menu = dict.get(config, 'menu')
+    if isinstance(menu, dict) and not all(dict.values(menu)):
+        # Drop empty submenus in place so only those become dirty
+        menu = config['menu']
+        for name in [k for k, v in dict.items(menu) if not v]:
+            del menu[name]
+
+    if _config_cache.unchanged(path, config):
+        return False
+
+    # history builds on this module, so it can only be imported once this one is
+    from . import history
+    previous = _config_cache.current(path) if history.ENABLED else None
+    if previous is None and history.ENABLED:
+        previous = _read_previous(path)
+    text, chunks = _config_cache.render(path, config)
+
+    # On first run there's no config directory yet; a bare file name has none
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    _config_cache.store(path, config, text if chunks is None else None, chunks)
+    if history.ENABLED:
+        history.record(path, *previous, text, config)
+    return True
+
+
+def _read_previous(path):
+    """(text, config) of the file about to be replaced, for the history"""
+    try:
+        with open(path) as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None, None
+    try:
+        return text, toml_codec.loads(text)
+    except toml_codec.TOMLDecodeError:
+        return text, None
+
+
+def clean_config(path=CONFIG_PATH, dry_run=False, watch=True):
+    """
+    Remove orphaned sections and empty submenus from the file at path.
+
+    Returns the names of the sections removed (or that would be, with
+    dry_run). The file is only rewritten when there is something to remove,
+    so a clean config keeps its mtime.
+    """
+    config = read_config(path, watch)
+    with _config_cache.lock:
+        removed = list(_config_cache.orphans) if _config_cache.path == path else []
+    menu = config.get('menu')
+    if isinstance(menu, dict):
+        removed += [f'menu.{name}' for name, value in dict.items(menu) if not value]
+    if removed and not dry_run:
+        write_config(path, config)
+    return removed
+
+
+def convert_value_type(value):
+    if isinstance(value, str):
+        if value.lower() == 'true':
+            return True
+        elif value.lower() == 'false':
+            return False
+        elif value.isdigit():
+            return int(value)
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+# ======================
+# Submenu Items
+# ======================
+
+_ITEM_KEY_RE = re.compile(r'item_?(\d+)')
+
+
+def item_number(key):
+    """5 for 'item_5' (or the older 'item5'), None for any other key"""
+    match = _ITEM_KEY_RE.fullmatch(key)
+    return int(match.group(1)) if match else None
+
+
+class SubmenuItems:
+    """
+    Sorted numeric index over a submenu's item_N tables.
+
+    Built once per table and kept in step with it: new numbers come from a
+    high-water mark in O(1) and listings are already in item order, so
+    nothing re-parses keys or re-sorts on render. ``size`` is the length of
+    the table the index is in step with.
+    """
+
+    def __init__(self, table):
+        items = sorted((num, key) for key, num in ((key, item_number(key)) for key in table)
+                       if num is not None and isinstance(dict.get(table, key), dict))
+        self.numbers = [num for num, _ in items]
+        self.keys = [key for _, key in items]
+        self.high = self.numbers[-1] if items else 0
+        self.size = len(table)
+
+    def copy(self):
+        index = SubmenuItems.__new__(SubmenuItems)
+        index.numbers = list(self.numbers)
+        index.keys = list(self.keys)
+        index.high = self.high
+        index.size = self.size
+        return index
+
+    def allocate(self, count=1):
+        """
+        count unused item keys after the highest one. They join the index
+        once they are set in the table; a key that never is only leaves a
+        gap in the numbering.
+        """
+        keys = [f'item_{num}' for num in range(self.high + 1, self.high + count + 1)]
+        self.high += count
+        return keys
+
+    def add(self, key, is_item=True):
+        """Take in a key set in the table; is_item is False if its value isn't a table"""
+        self.size += 1
+        num = item_number(key)
+        if num is None or not is_item:
+            return
+        i = bisect.bisect_left(self.numbers, num)
+        if i < len(self.numbers) and self.numbers[i] == num:
+            return
+        self.numbers.insert(i, num)
+        self.keys.insert(i, key)
+        self.high = max(self.high, num)
+
+    def discard(self, key):
+        """Forget a key removed from the table"""
+        self.size -= 1
+        num = item_number(key)
+        if num is None:
+            return
+        i = bisect.bisect_left(self.numbers, num)
+        if i < len(self.numbers) and self.keys[i] == key:
+            del self.numbers[i]
+            del self.keys[i]
+
+
+def submenu_items(name, table):
+    """
+    Item index of a submenu table. The tables of the cached config share
+    one per submenu. A view gets its own, copied from the table it wraps
+    and kept in step with its keys, so edits made to a layer that is
+    thrown away (a failed batch, a preview) never reach any other index.
+    """
+    if not isinstance(table, ConfigView):
+        return _config_cache.submenu_items(name, table)
+    index = table._items
+    if not index or index.size != len(table):
+        source = table._source
+        if index is None and source is not None and len(source) == len(table):
+            index = submenu_items(name, source).copy()
+        else:
+            index = SubmenuItems(table)
+        table._items = index
+    return index
+
+
+# ======================
+# Records
+# ======================
+
+
+class Record:
+    """
+    Base for the slotted records that stand for small config tables: a
+    dockbar app, a folder or a menu item holds one attribute per field
+    instead of a dict of its own.
+
+    ``FIELDS`` are the keys stored in the config, in file order, and
+    ``REQUIRED`` the ones a submitted entry must have; other slots (a menu
+    item's key) say where the entry lives and are None when unknown.
+    Records read like the tables they came from (``get``, ``record[key]``,
+    ``**record``), so listings, templates and JSON take either. They are
+    frozen: cached menu models and listings share them between requests.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+    REQUIRED = ()
+    DEFAULTS = {}
+
+    @classmethod
+    def from_toml(cls, table, **where):
+        """Record of a config table as it is, unchecked; missing fields are None"""
+        values = dict.fromkeys(cls.__slots__)
+        values.update(where)
+        for field in cls.FIELDS:
+            values[field] = table.get(field)
+        return cls(**values)
+
+    @classmethod
+    def parse(cls, table, partial=False, **where):
+        """
+        Record of a submitted entry (a form or a JSON object), filling in
+        DEFAULTS. Raises ValueError when a REQUIRED field is missing (unless
+        partial, for edits that only send some fields) or a field isn't a
+        string.
+        """
+        missing = [] if partial else [field for field in cls.REQUIRED if field not in table]
+        if missing:
+            raise ValueError(f"Missing {', '.join(missing)}")
+        values = dict.fromkeys(cls.__slots__)
+        values.update(where)
+        for field in cls.FIELDS:
+            value = table.get(field, cls.DEFAULTS.get(field))
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{field} must be a string")
+            values[field] = value
+        return cls(**values)
+
+    def to_toml(self):
+        """The table to store, leaving out fields that aren't set"""
+        table = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                table[field] = value
+        return table
+
+    def keys(self):
+        return self.__slots__
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+
+@dataclass(frozen=True)
+class DockbarApp(Record):
+    """An app in [dockbar]"""
+
+    __slots__ = ('cmd', 'icon', 'wclass', 'desktop_file', 'name', 'initial_title')
+    FIELDS = __slots__
+    REQUIRED = ('cmd', 'name')
+    DEFAULTS = {'wclass': '', 'desktop_file': ''}
+
+    cmd: str
+    icon: str
+    wclass: str
+    desktop_file: str
+    name: str
+    initial_title: str
+
+
+@dataclass(frozen=True)
+class FolderEntry(Record):
+    """A bookmarked folder in [folders]"""
+
+    __slots__ = ('name', 'path', 'filemanager', 'icon')
+    FIELDS = __slots__
+    REQUIRED = ('name', 'path')
+
+    name: str
+    path: str
+    filemanager: str
+    icon: str
+
+
+@dataclass(frozen=True)
+class MenuItem(Record):
+    """
+    An item of a submenu. key and num are its item_N key and number, None
+    for the items of a list-style submenu.
+    """
+
+    __slots__ = ('key', 'num', 'name', 'cmd')
+    FIELDS = ('name', 'cmd')
+    REQUIRED = FIELDS
+
+    key: str
+    num: int
+    name: str
+    cmd: str
+
+
+@dataclass(frozen=True)
+class Submenu:
+    """A submenu of [menu]: its items in order and the first one's name"""
+
+    __slots__ = ('name', 'items', 'preview')
+
+    name: str
+    items: tuple
+    preview: str
+
+
+# Record type of the entries of each section that has one
+RECORDS = {'dockbar': DockbarApp, 'folders': FolderEntry}
+
+
+# ======================
+# Menu View Model
+# ======================
+
+
+class MenuModel:
+    """
+    Read-only snapshot of [menu] for rendering: submenus in file order, each
+    with its items in item order and the first item's name as a preview.
+
+    Built from plain tables without going through ConfigView, so rendering
+    never marks anything dirty. menu_model() caches one per loaded config.
+    """
+
+    __slots__ = ('submenus', 'by_name')
+
+    def __init__(self, menu):
+        submenus = []
+        for name, data in dict.items(menu):
+            if name == 'icons':
+                continue
+            if isinstance(data, list):
+                items = tuple(MenuItem.from_toml(item) for item in data if isinstance(item, dict))
+            elif isinstance(data, dict):
+                index = submenu_items(name, data)
+                items = tuple(MenuItem.from_toml(dict.get(data, key), key=key, num=num)
+                              for num, key in zip(index.numbers, index.keys))
+            else:
+                continue
+            submenus.append(Submenu(name, items, items[0].name if items else None))
+        self.submenus = tuple(submenus)
+        self.by_name = {submenu.name: submenu for submenu in self.submenus}
+
+    def get(self, name):
+        return self.by_name.get(name)
+
+
+def derived(config, name, build):
+    """
+    build(config), shared by every request until the file changes.
+
+    Only an unmodified view of the cached config is served from the cache;
+    anything else (pending edits, a missing file) is built fresh.
+    """
+    if isinstance(config, ConfigView):
+        if config._dirty or config._base is None:
+            return build(config)
+        config = config._base
+    return _config_cache.view(config, name, build)
+
+
+def menu_model(config):
+    return derived(config, 'menu', lambda config: MenuModel(config.get('menu', {})))
+
+
+# ======================
+# Listings
+# ======================
+
+
+class Listing:
+    """
+    Rows of a listing page (dockbar apps, folders, submenus or the items of
+    one submenu) plus a search index over their ids, names and commands.
+
+    Rows are (id, table) pairs in config order. Prefix matches on any word
+    are found by bisecting a sorted word list and come first; other
+    substring matches follow, each group in config order. ``sources`` are
+    the config tables the rows were made from (the row tables themselves
+    unless given), for caches that check whether a row changed.
+    """
+
+    __slots__ = ('rows', 'sources', 'texts', 'words', 'positions')
+
+    def __init__(self, rows, fields=('name', 'cmd'), sources=None):
+        self.rows = tuple(rows)
+        self.sources = tuple(sources) if sources is not None else tuple(table for _, table in self.rows)
+        self.texts = []
+        words = []
+        positions = []
+        for i, (row_id, table) in enumerate(self.rows):
+            text = ' '.join([str(row_id)] + [str(table.get(field, '')) for field in fields]).lower()
+            self.texts.append(text)
+            for word in set(text.split()):
+                words.append(sys.intern(word))
+                positions.append(i)
+        # Sorted words with the row of each in a parallel array, rather than
+        # a (word, row) tuple per word: a fraction of the memory on big configs
+        order = sorted(range(len(words)), key=words.__getitem__)
+        self.words = [words[i] for i in order]
+        self.positions = array('L', [positions[i] for i in order])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, query):
+        """Positions of the rows matching query"""
+        query = query.strip().lower()
+        if not query:
+            return range(len(self.rows))
+        prefix = set()
+        i = bisect.bisect_left(self.words, query)
+        while i < len(self.words) and self.words[i].startswith(query):
+            prefix.add(self.positions[i])
+            i += 1
+        rest = [i for i, text in enumerate(self.texts) if i not in prefix and query in text]
+        return sorted(prefix) + rest
+
+    def page(self, query='', offset=0, limit=None):
+        """(total, rows) for one page of the matches, rows as (position, id, table)"""
+        matches = self.search(query)
+        end = None if limit is None else offset + limit
+        return len(matches), [(i, *self.rows[i]) for i in matches[offset:end]]
+
+
+def _table_rows(table):
+    return ((key, value) for key, value in dict.items(table) if isinstance(value, dict))
+
+
+def _build_listing(config, name):
+    menu = config.get('menu', {})
+    if name == 'menu':
+        submenus = menu_model(config).submenus
+        return Listing(((submenu.name, {'preview': submenu.preview, 'count': len(submenu.items)})
+                        for submenu in submenus), fields=('preview',),
+                       sources=(dict.get(menu, submenu.name) for submenu in submenus))
+    if isinstance(name, tuple):
+        submenu = menu_model(config).get(name[1])
+        items = submenu.items if submenu else ()
+        data = dict.get(menu, name[1])
+        if isinstance(data, list):
+            sources = [item for item in data if isinstance(item, dict)]
+        else:
+            sources = [dict.get(data, item.key) for item in items]
+        return Listing(((item.key or str(i), item) for i, item in enumerate(items)),
+                       sources=sources)
+    fields = ('name', 'path') if name == 'folders' else ('name', 'cmd')
+    return Listing(_table_rows(config.get(name, {})), fields)
+
+
+def _section_hash(config, name):
+    # Hashes the parsed tree, much cheaper than serializing the table
+    return tree_digest(dict.get(config, name), {})[:12].hex() if name in config else ''
+
+
+def content_digest(config, sections):
+    """
+    Digest of the named top-level tables, each hashed once per loaded
+    config. None when config isn't an unmodified view of the cached file
+    (pending edits, no file yet), whose content can't be vouched for.
+    """
+    if not isinstance(config, ConfigView) or config._dirty or config._base is None:
+        return None
+    digests = ''.join(derived(config, ('hash', name), lambda config, name=name: _section_hash(config, name))
+                      for name in sections)
+    return hashlib.blake2b(digests.encode(), digest_size=12).hexdigest()
+
+
+def section_hashes(config):
+    """Hash of every top-level table, e.g. to tell which ones a change touched"""
+    return {name: derived(config, ('hash', name), lambda config, name=name: _section_hash(config, name))
+            for name in config}
+
+
+def listing(config, name):
+    """
+    Listing for 'dockbar', 'folders', 'menu' (the submenus) or
+    ('menu', submenu_name) (one submenu's items)
+    """
+    return derived(config, ('listing', name), lambda config: _build_listing(config, name))
+
+
+# ======================
+# Key Paths
+# ======================
+
+
+def split_key(key):
+    """'panel.top.height' -> ['panel', 'top', 'height']"""
+    parts = key.split('.')
+    if not all(parts):
+        raise KeyError(key)
+    return parts
+
+
+def get_key(config, key):
+    value = config
+    for part in split_key(key):
+        if not isinstance(value, dict) or part not in value:
+            raise KeyError(key)
+        value = value[part]
+    return value
+
+
+def set_key(config, key, value):
+    """Set a dotted key, creating missing tables on the way"""
+    *parents, name = split_key(key)
+    table = config
+    for part in parents:
+        if part not in table:
+            table[part] = {}
+        table = table[part]
+        if not isinstance(table, dict):
+            raise KeyError(key)
+    table[name] = value
+
+
+def delete_key(config, key):
+    *parents, name = split_key(key)
+    table = get_key(config, '.'.join(parents)) if parents else config
+    if not isinstance(table, dict) or name not in table:
+        raise KeyError(key)
+    del table[name]
+
+
+# ======================
+# Panel Schema
+# ======================
+
+_TOML_TYPES = ((bool, 'boolean'), (int, 'integer'), (float, 'float'), (str, 'string'),
+               (list, 'array'), (dict, 'table'), (datetime, 'datetime'), (date, 'date'), (time, 'time'))
+_TRUE = ('true', 'yes', 'on', '1')
+_FALSE = ('false', 'no', 'off', '0')
+
+
+def toml_type(value):
+    """TOML type name of a parsed value, e.g. 'integer' for 32"""
+    for cls, name in _TOML_TYPES:
+        if isinstance(value, cls):
+            return name
+    raise TypeError(f"Not a TOML value: {value!r}")
+
+
+class PanelSchema:
+    """
+    Type of every setting under [panel], inferred from the config.
+
+    Keys are dotted paths relative to [panel] ('top.height'), as used by the
+    panel form. coerce() turns submitted text back into a value of the
+    setting's TOML type, so a save writes ``height = 32`` rather than
+    ``height = "32"``; form_value() is the inverse for filling in the form.
+    """
+
+    def __init__(self, panel):
+        self.types = {}
+        self._collect(panel, ())
+
+    def _collect(self, table, path):
+        for key, value in dict.items(table):
+            if isinstance(value, dict):
+                self._collect(value, path + (key,))
+            else:
+                self.types['.'.join(path + (key,))] = toml_type(value)
+
+    def coerce(self, key, text):
+        """Value for key parsed from form text; raises ValueError if it doesn't fit the type"""
+        kind = self.types.get(key)
+        if kind is None:
+            # A key the config doesn't have yet, guess from the text
+            return convert_value_type(text)
+        if kind == 'string':
+            return text
+        text = text.strip()
+        if kind == 'boolean':
+            if text.lower() in _TRUE:
+                return True
+            if text.lower() in _FALSE:
+                return False
+            raise ValueError(f'{key} must be true or false')
+        if kind in ('integer', 'float'):
+            try:
+                return int(text) if kind == 'integer' else float(text)
+            except ValueError:
+                raise ValueError(f'{key} must be {"an integer" if kind == "integer" else "a number"}') from None
+        try:
+            value = toml_codec.loads(f'v = {text}')['v']
+        except toml_codec.TOMLDecodeError:
+            value = None
+        if value is None or toml_type(value) != kind:
+            raise ValueError(f'{key} must be a TOML {kind}')
+        return value
+
+    @staticmethod
+    def form_value(value):
+        """Text for a setting's form field"""
+        if isinstance(value, str):
+            return value
+        return toml_codec.format_value(value)
+
+
+def panel_schema(config):
+    return derived(config, 'panel_schema', lambda config: PanelSchema(dict.get(config, 'panel') or {}))
+
+
+def update_panel(config, form):
+    """
+    Apply the panel form's fields (dotted keys to text) to config.
+
+    Every field is coerced to its setting's type first, and only settings
+    whose value actually changed are written, so untouched tables stay
+    clean and saving an unchanged form is a no-op. Keys missing from the
+    form are left alone. Raises ValueError listing every invalid field.
+    Returns the keys that changed.
+    """
+    schema = panel_schema(config)
+    values = {}
+    errors = []
+    for key, text in form.items():
+        try:
+            split_key(key)
+            values[key] = schema.coerce(key, text)
+        except KeyError:
+            errors.append(f'{key} is not a valid setting name')
+        except ValueError as e:
+            errors.append(str(e))
+    if errors:
+        raise ValueError('; '.join(errors))
+
+    panel = config.setdefault('panel', {})
+    changed = []
+    for key, value in values.items():
+        try:
+            current = get_key(panel, key)
+        except KeyError:
+            pass
+        else:
+            if type(current) is type(value) and current == value:
+                continue
+        set_key(panel, key, value)
+        changed.append(key)
+    return changed
+
+
+# ======================
+# Dockbar Order
+# ======================
+
+
+class DockOrder:
+    """
+    Position index over the [dockbar] table, whose key order is the dock order.
+
+    Building it is one pass over the table; after that position lookups are
+    O(1) and any number of moves are written back by a single apply().
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.names = list(table)
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+    def position(self, name):
+        return self.index[name]
+
+    def move(self, name, position):
+        """Move name to position (clamped to the dock) and return where it landed"""
+        old = self.index[name]
+        position = max(0, min(position, len(self.names) - 1))
+        if position != old:
+            self.names.insert(position, self.names.pop(old))
+            for i in range(min(old, position), max(old, position) + 1):
+                self.index[self.names[i]] = i
+        return position
+
+    def reorder(self, names):
+        """Put names first, in that order; unlisted apps keep their relative order"""
+        for name in names:
+            if name not in self.index:
+                raise KeyError(name)
+        listed = set(names)
+        if len(listed) != len(names):
+            raise ValueError('Ordering lists an application twice')
+        self.names = list(names) + [name for name in self.names if name not in listed]
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+    def apply(self, config):
+        """Rewrite [dockbar] in the new order; returns False if nothing moved"""
+        if self.names == list(self.table):
+            return False
+        config['dockbar'] = {name: self.table[name] for name in self.names}
+        return True
+
+
+# ======================
+# Config Diff
+# ======================
+
+# Tables whose key order is meaningful, so reordering them is a change
+ORDERED_SECTIONS = ('dockbar',)
+
+
+def tree_digest(value, memo):
+    """
+    Order-sensitive hash of a config subtree. memo maps id() of tables and
+    lists to their digest, so each subtree is hashed once per comparison.
+    """
+    entry = memo.get(id(value))
+    if entry is not None:
+        return entry[1]
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(value, dict):
+        digest.update(b'{')
+        for key, child in dict.items(value):
+            digest.update(key.encode() + b'\0')
+            digest.update(_child_digest(child, memo))
+    elif isinstance(value, list):
+        digest.update(b'[')
+        for child in value:
+            digest.update(_child_digest(child, memo))
+    else:
+        digest.update(_scalar_digest(value))
+    digest = digest.digest()
+    if isinstance(value, (dict, list)):
+        # Holding the value keeps its id from being reused during the diff
+        memo[id(value)] = (value, digest)
+    return digest
+
+
+def _scalar_digest(value):
+    # The type is part of the value: 1, 1.0, true and "1" all differ
+    return f'{type(value).__name__}:{value!r}'.encode()
+
+
+def _child_digest(value, memo):
+    # Scalars go into their table's hash as they are, without a hash of their own;
+    # repr() never holds a NUL, so the terminator keeps them apart
+    if isinstance(value, (dict, list)):
+        return b'\1' + tree_digest(value, memo)
+    return _scalar_digest(value) + b'\0'
+
+
+def _same(old, new, memo):
+    if old is new:
+        return True
+    if isinstance(old, dict) and isinstance(new, dict):
+        # Walk tables so subtrees shared by both sides are skipped unhashed
+        return (len(old) == len(new) and list(old) == list(new) and
+                all(_same(dict.__getitem__(old, key), dict.__getitem__(new, key), memo) for key in old))
+    return tree_digest(old, memo) == tree_digest(new, memo)
+
+
+def same_config(old, new):
+    """True if the two configs would be written out identically"""
+    return _same(old, new, {})
+
+
+def _stable_positions(positions):
+    """Members of the longest increasing run of positions, i.e. the entries that stayed put"""
+    tails, tail_index, parents = [], [], [None] * len(positions)
+    for i, position in enumerate(positions):
+        j = bisect.bisect_left(tails, position)
+        parents[i] = tail_index[j - 1] if j else None
+        if j == len(tails):
+            tails.append(position)
+            tail_index.append(i)
+        else:
+            tails[j] = position
+            tail_index[j] = i
+    stable = set()
+    i = tail_index[-1] if tail_index else None
+    while i is not None:
+        stable.add(positions[i])
+        i = parents[i]
+    return stable
+
+
+def _moves(old, new, path, out):
+    old_positions = {key: i for i, key in enumerate(old) if key in new}
+    kept = [key for key in new if key in old_positions]
+    stable = _stable_positions([old_positions[key] for key in kept])
+    new_positions = {key: i for i, key in enumerate(new)}
+    out['moved'].extend({'path': [*path, key], 'from': old_positions[key], 'to': new_positions[key]}
+                        for key in kept if old_positions[key] not in stable)
+
+
+def _diff(old, new, path, memo, out):
+    if old is new:
+        return
+    if not (isinstance(old, dict) and isinstance(new, dict)):
+        if not _same(old, new, memo):
+            out['changed'].append({'path': list(path), 'old': old, 'new': new})
+        return
+    for key, value in dict.items(old):
+        if key not in new:
+            out['removed'].append({'path': [*path, key], 'value': value})
+    for key, value in dict.items(new):
+        if key not in old:
+            out['added'].append({'path': [*path, key], 'value': value})
+        else:
+            _diff(dict.__getitem__(old, key), value, (*path, key), memo, out)
+    if len(path) == 1 and path[0] in ORDERED_SECTIONS:
+        _moves(old, new, path, out)
+
+
+def diff_configs(old, new):
+    """
+    Structural diff of two config trees: keys added, removed and changed in
+    each table, plus dockbar entries that moved. Subtrees shared between the
+    two trees (copy-on-write views share everything they didn't touch) are
+    skipped without descending and arrays are compared by hash, so diffing
+    a view against its base costs time linear in the part that was edited.
+    """
+    out = {'added': [], 'removed': [], 'changed': [], 'moved': []}
+    _diff(old, new, (), {}, out)
+    return out
+
+
+# ======================
+# Batch Operations
+# ======================
+
+BATCH_SECTIONS = ('dockbar', 'folders', 'menu', 'panel')
+BATCH_OPS = ('add', 'edit', 'delete', 'move')
+
+
+class BatchError(ValueError):
+    """An operation in a batch could not be applied"""
+
+
+class Batch:
+    """
+    Applies a list of operations to one config, for the batch API.
+
+    Each operation is a dict like ``{"op": "add", "section": "dockbar",
+    "id": "firefox", "value": {...}}``. Menu items also take ``submenu``
+    and dockbar moves take ``position``; ``edit`` updates the given fields
+    of a table and replaces a panel value. Dock moves share one DockOrder
+    that is only written back when another dockbar edit needs the table or
+    the batch finishes, so a run of moves costs a single rewrite of
+    [dockbar]. Dockbar, folder and menu entries are checked by their
+    records. Any failure raises BatchError; callers apply a batch to a
+    throwaway layer so nothing is kept unless every operation succeeds.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.order = None
+        # Section tables already looked up, so each operation costs one dict lookup
+        self.tables = {}
+
+    def apply(self, operation):
+        """Apply one operation and return its result as a dict"""
+        if not isinstance(operation, dict):
+            raise BatchError('Operation must be an object')
+        op, section = operation.get('op'), operation.get('section')
+        if op not in BATCH_OPS:
+            raise BatchError(f'Unknown op {op!r}, expected one of {", ".join(BATCH_OPS)}')
+        if section not in BATCH_SECTIONS:
+            raise BatchError(f'Unknown section {section!r}, expected one of {", ".join(BATCH_SECTIONS)}')
+        if op == 'move' and section != 'dockbar':
+            raise BatchError('Only dockbar entries can be moved')
+        if op != 'move':
+            self._settle()
+        if section == 'menu':
+            return self._apply_menu(op, operation)
+        return self._apply_table(op, section, operation)
+
+    def finish(self):
+        self._settle()
+
+    def _settle(self):
+        if self.order is not None:
+            if self.order.apply(self.config):
+                self.tables.pop('dockbar', None)
+            self.order = None
+
+    def _table(self, section, create=False):
+        table = self.tables.get(section)
+        if table is None:
+            table = self.config.setdefault(section, {}) if create else self.config.get(section)
+            if table is None:
+                return {}
+            self.tables[section] = table
+        return table
+
+    def _apply_table(self, op, section, operation):
+        key = _operation_id(operation)
+        table = self._table(section)
+        if op == 'move':
+            if self.order is None:
+                self.order = DockOrder(table)
+            if key not in self.order:
+                raise BatchError(f'No {section} entry {key!r}')
+            try:
+                position = int(operation['position'])
+            except (KeyError, TypeError, ValueError):
+                raise BatchError('move needs an integer "position"') from None
+            return {'id': key, 'position': self.order.move(key, position)}
+        if op == 'delete':
+            if key not in table:
+                raise BatchError(f'No {section} entry {key!r}')
+            del table[key]
+            return {'id': key}
+
+        value = operation.get('value')
+        if section == 'panel':
+            if value is None:
+                raise BatchError('panel entries need a "value"')
+        elif not isinstance(value, dict):
+            raise BatchError(f'{section} entries need a "value" object')
+        if op == 'add':
+            if key in table:
+                raise BatchError(f'{section} entry {key!r} already exists')
+            _parse_entry(RECORDS.get(section), value, f'{section} entry {key!r}')
+            self._table(section, create=True)[key] = value
+        else:
+            if key not in table:
+                raise BatchError(f'No {section} entry {key!r}')
+            if section == 'panel' or not isinstance(table[key], dict):
+                table[key] = value
+            else:
+                _parse_entry(RECORDS.get(section), value, f'{section} entry {key!r}', partial=True)
+                table[key].update(value)
+        return {'id': key}
+
+    def _apply_menu(self, op, operation):
+        name = operation.get('submenu')
+        if not isinstance(name, str) or not name:
+            raise BatchError('menu operations need a "submenu"')
+        menu = self._table('menu')
+        item = operation.get('id')
+        value = operation.get('value')
+
+        if op == 'add' and value is None:
+            if name in menu:
+                raise BatchError(f'Submenu {name!r} already exists')
+            self._table('menu', create=True)[name] = {}
+            return {'submenu': name}
+        submenu = menu.get(name)
+        if not isinstance(submenu, dict):
+            raise BatchError(f'No submenu {name!r}')
+        if op == 'delete' and item is None:
+            del menu[name]
+            return {'submenu': name}
+
+        if op == 'add':
+            if not isinstance(value, dict):
+                raise BatchError('menu items need a "value" with "name" and "cmd"')
+            _parse_entry(MenuItem, value, 'menu item')
+            key, = submenu_items(name, submenu).allocate()
+            submenu[key] = value
+            return {'submenu': name, 'id': key}
+
+        key = f'item_{item}' if isinstance(item, int) else str(item)
+        if item is None or key not in submenu:
+            raise BatchError(f'No item {item!r} in submenu {name!r}')
+        if op == 'delete':
+            del submenu[key]
+        else:
+            if not isinstance(value, dict):
+                raise BatchError('menu items need a "value" object')
+            _parse_entry(MenuItem, value, f'item {key!r}', partial=True)
+            submenu[key].update(value)
+        return {'submenu': name, 'id': key}
+
+
+def _parse_entry(record, value, what, partial=False):
+    if record is None:
+        return None
+    try:
+        return record.parse(value, partial)
+    except ValueError as e:
+        raise BatchError(f'{what}: {e}') from None
+
+
+def _operation_id(operation):
+    key = operation.get('id')
+    if not isinstance(key, str) or not key:
+        raise BatchError('Operation needs an "id"')
+    return key
+
+
+def apply_batch(config, operations):
+    """
+    Apply operations to config in order and return one result per operation.
+    Stops at the first failure with BatchError, whose ``index`` is the
+    position of the failing operation.
+    """
+    batch = Batch(config)
+    results = []
+    for index, operation in enumerate(operations):
+        try:
+            results.append(batch.apply(operation))
+        except BatchError as e:
+            e.index = index
+            raise
+    batch.finish()
+    return results
+
+
+# ======================
+# Import / Export
+# ======================
+
+# Sections whose entries can be exported and imported, and the formats
+TRANSFER_SECTIONS = ('dockbar', 'folders', 'menu')
+TRANSFER_FORMATS = ('jsonl', 'toml')
+
+
+class TransferError(ValueError):
+    """Import data that can't be read or applied"""
+
+
+def config_entries(config, sections=TRANSFER_SECTIONS):
+    """
+    The entries of sections one at a time, as dicts like ``{"section":
+    "dockbar", "id": "firefox", "value": {...}}``. Menu items also have a
+    ``submenu``; the items of a list-style submenu have no ``id``.
+    """
+    for section in sections:
+        table = dict.get(config, section)
+        if not isinstance(table, dict):
+            continue
+        if section != 'menu':
+            for key, value in dict.items(table):
+                if isinstance(value, dict):
+                    yield {'section': section, 'id': key, 'value': value}
+            continue
+        for name, items in dict.items(table):
+            if name == 'icons':
+                continue
+            if isinstance(items, list):
+                for item in items:
+                    if isinstance(item, dict):
+                        yield {'section': section, 'submenu': name, 'value': item}
+            elif isinstance(items, dict):
+                for key, item in dict.items(items):
+                    if isinstance(item, dict) and item_number(key) is not None:
+                        yield {'section': section, 'submenu': name, 'id': key, 'value': item}
+
+
+def dump_entries(entries, fmt='jsonl'):
+    """
+    Serialize entries one at a time: a JSON object per line, or a TOML
+    table per entry that together make a valid document
+    """
+    if fmt == 'jsonl':
+        for entry in entries:
+            yield json.dumps(entry, default=str) + '\n'
+        return
+    separator = ''
+    for entry in entries:
+        path = (entry['section'], entry['submenu']) if 'submenu' in entry else (entry['section'],)
+        if 'id' in entry:
+            text = toml_codec.dumps_table(path + (entry['id'],), entry['value'])
+        else:
+            text = toml_codec.dumps_table(path, entry['value'], array=True)
+        yield separator + text
+        separator = '\n'
+
+
+def _transfer_entry(entry):
+    """(section, submenu, id, value) of an entry to import, checked by its record"""
+    if not isinstance(entry, dict):
+        raise ValueError('Expected an object')
+    section, key, value = entry.get('section'), entry.get('id'), entry.get('value')
+    if section not in TRANSFER_SECTIONS:
+        raise ValueError(f'Unknown section {section!r}, expected one of {", ".join(TRANSFER_SECTIONS)}')
+    if not isinstance(value, dict):
+        raise ValueError('Entry needs a "value" object')
+    if section != 'menu':
+        if not isinstance(key, str) or not key:
+            raise ValueError('Entry needs an "id"')
+        _parse_entry(RECORDS[section], value, f'{section} entry {key!r}')
+        return section, None, key, value
+    submenu = entry.get('submenu')
+    if not isinstance(submenu, str) or not submenu or submenu == 'icons':
+        raise ValueError('Menu items need a "submenu"')
+    if key is not None and (not isinstance(key, str) or item_number(key) is None):
+        raise ValueError(f'Menu item ids look like item_1, not {key!r}')
+    _parse_entry(MenuItem, value, 'menu item')
+    # Stored as given, keeping keys MenuItem doesn't know (icon, ...)
+    return section, submenu, key, value
+
+
+class EntryReader:
+    """
+    Incremental reader for import data. feed() takes text in pieces of any
+    size and returns the entries it completed, checked and as (section,
+    submenu, id, value) tuples; close() returns the rest. Entries outside
+    sections are dropped.
+
+    JSON Lines hold one entry per line, as written by dump_entries(). TOML
+    is cut into one table per entry as it comes in, so even a whole
+    waypanel.toml is parsed an entry at a time; its other tables are
+    skipped. Errors raise TransferError with the line they start on.
+    """
+
+    def __init__(self, fmt='jsonl', sections=TRANSFER_SECTIONS):
+        if fmt not in TRANSFER_FORMATS:
+            raise TransferError(f'Unknown format {fmt!r}, expected one of {", ".join(TRANSFER_FORMATS)}')
+        self.fmt = fmt
+        self.sections = sections
+        self.partial = ''
+        self.line = 0
+        # TOML: lines of the entry being read, where it starts and its key path
+        self.lines = []
+        self.start = 1
+        self.unit = None
+        self.depth = 0
+        self.multiline = None
+
+    def feed(self, text):
+        lines = (self.partial + text).split('\n')
+        self.partial = lines.pop()
+        entries = []
+        for line in lines:
+            self.line += 1
+            entries.extend(self._read_line(line + '\n'))
+        return entries
+
+    def close(self):
+        entries = []
+        if self.partial:
+            self.line += 1
+            entries.extend(self._read_line(self.partial))
+            self.partial = ''
+        if self.fmt == 'toml':
+            entries.extend(self._read_table())
+        return entries
+
+    def _checked(self, entries, line):
+        checked = []
+        for entry in entries:
+            try:
+                entry = _transfer_entry(entry)
+            except ValueError as e:
+                raise TransferError(f'Line {line}: {e}') from None
+            if entry[0] in self.sections:
+                checked.append(entry)
+        return checked
+
+    def _read_line(self, line):
+        if self.fmt == 'toml':
+            return self._read_toml_line(line)
+        if not line.strip():
+            return ()
+        try:
+            entry = json.loads(line)
+        except ValueError as e:
+            raise TransferError(f'Line {self.line}: {e}') from None
+        return self._checked([entry], self.line)
+
+    def _read_toml_line(self, line):
+        done = ()
+        if self.multiline is None and self.depth == 0 and _HEADER_START_RE.match(line):
+            path = _header_path(line)
+            if path is not None:
+                unit = path[:3] if path[0] == 'menu' else path[:2]
+                # Each [[menu.name]] header starts an item of a list-style submenu
+                item = line.lstrip().startswith('[[') and len(path) <= len(unit)
+                if unit != self.unit or item:
+                    done = self._read_table()
+                    self.start = self.line
+                self.unit = unit
+        self.lines.append(line)
+        self._scan(line)
+        return done
+
+    def _scan(self, line):
+        """Track open brackets and multi-line strings, where a [header] line isn't one"""
+        pos = 0
+        if self.multiline is not None:
+            pos = _multiline_end(line, 0, self.multiline)
+            if pos < 0:
+                return
+            self.multiline = None
+        while True:
+            match = _TOKEN_RE.search(line, pos)
+            if match is None:
+                return
+            token = match.group()
+            pos = match.end()
+            if token in ('"""', "'''"):
+                pos = _multiline_end(line, pos, token)
+                if pos < 0:
+                    self.multiline = token
+                    return
+            elif token in ('[', '{'):
+                self.depth += 1
+            elif token in (']', '}'):
+                self.depth -= 1
+
+    def _read_table(self):
+        if not self.lines:
+            return ()
+        text = ''.join(self.lines)
+        self.lines = []
+        try:
+            data = toml_codec.loads(text)
+        except toml_codec.TOMLDecodeError as e:
+            raise TransferError(f'Line {self.start}: {e}') from None
+        return self._checked(config_entries(data, self.sections), self.start)
+
+
+def read_entries(chunks, fmt='jsonl', sections=TRANSFER_SECTIONS):
+    """Entries of an iterable of text such as an open file, read as they are consumed"""
+    reader = EntryReader(fmt, sections)
+    for text in chunks:
+        yield from reader.feed(text)
+    yield from reader.close()
+
+
+def import_entries(config, entries, replace=()):
+    """
+    Apply entries from EntryReader to config and return how many went into
+    each section. An entry overwrites the one with the same id or is added;
+    menu items without an id get the next free item_N. The sections in
+    replace are emptied first (every submenu, for 'menu'), so the imported
+    entries become all they hold.
+    """
+    for section in replace:
+        table = config.get(section)
+        if not isinstance(table, dict):
+            continue
+        if section == 'menu':
+            for name in [name for name in table if name != 'icons']:
+                del table[name]
+        else:
+            config[section] = {}
+
+    counts = dict.fromkeys(TRANSFER_SECTIONS, 0)
+    # Tables already looked up, so each entry costs one dict lookup
+    tables = {}
+    for section, submenu, key, value in entries:
+        counts[section] += 1
+        if section != 'menu':
+            table = tables.get(section)
+            if table is None:
+                table = tables[section] = config.setdefault(section, {})
+            table[key] = value
+            continue
+        items = tables.get(('menu', submenu))
+        if items is None:
+            menu = tables.get('menu')
+            if menu is None:
+                menu = tables['menu'] = config.setdefault('menu', {})
+            items = tables['menu', submenu] = menu.setdefault(submenu, {})
+        if not isinstance(items, (dict, list)):
+            raise TransferError(f'menu.{submenu} is not a submenu')
+        if isinstance(items, list):
+            if key is not None:
+                raise TransferError(f'Submenu {submenu!r} is a list, its items have no ids')
+            items.append(value)
+        elif key is None:
+            new_key, = submenu_items(submenu, items).allocate()
+            items[new_key] = value
+        else:
+            items[key] = value
+    return counts
@@ -0,0 +1,366 @@
+"""
+Version history for waypanel.toml.
+
+Every save is recorded in history/ next to the config file as a compressed
+structural delta against the version before it. Every SNAPSHOT_EVERY
+versions, and whenever the file was changed outside waypanel-settings, the
+whole file is stored as well. Deltas hold both sides of each change, so a
+version is rebuilt by replaying the fewest deltas from the nearest snapshot
+or from the current file, and undoing the last save costs one delta.
+
+Retention keeps at most MAX_VERSIONS versions in MAX_BYTES of disk; the
+oldest kept version is compacted into a snapshot when older ones are
+dropped. Set WAYPANEL_HISTORY=0 to turn recording off.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from . import toml_codec
+from .core import ORDERED_SECTIONS, diff_configs
+
+__all__ = ['ENABLED', 'record', 'versions', 'version_delta', 'version_config']
+
+ENABLED = os.environ.get('WAYPANEL_HISTORY', '1') != '0'
+SNAPSHOT_EVERY = 50
+MAX_VERSIONS = 500
+MAX_BYTES = 8 * 1024 * 1024
+# Compaction trims to this fraction of the limits, so it doesn't run on every save
+COMPACT_TO = 0.9
+
+
+def history_dir(path):
+    return os.path.join(os.path.dirname(path), 'history')
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+# ======================
+# Deltas
+# ======================
+
+# Values are stored as TOML literals so dates and times survive the JSON
+
+
+def _encode(value):
+    return toml_codec.format_value(value)
+
+
+def _decode(literal):
+    return toml_codec.loads(f'v = {literal}')['v']
+
+
+def make_delta(old, new):
+    """
+    The diff between two configs in storable form. Entries added to or
+    removed from an ordered table also record their position there.
+    """
+    diff = diff_configs(old, new)
+    indexes = {}
+
+    def position(config, section, key):
+        index = indexes.get((id(config), section))
+        if index is None:
+            index = indexes[id(config), section] = {k: i for i, k in enumerate(dict.get(config, section))}
+        return index[key]
+
+    def entry(change, config):
+        path = change['path']
+        out = {'path': path, 'value': _encode(change['value'])}
+        if len(path) == 2 and path[0] in ORDERED_SECTIONS:
+            out['position'] = position(config, path[0], path[1])
+        return out
+
+    return {
+        'added': [entry(change, new) for change in diff['added']],
+        'removed': [entry(change, old) for change in diff['removed']],
+        'changed': [{'path': change['path'], 'old': _encode(change['old']), 'new': _encode(change['new'])}
+                    for change in diff['changed']],
+        'moved': diff['moved'],
+    }
+
+
+def _set(config, path, value):
+    table = config
+    for key in path[:-1]:
+        table = table.setdefault(key, {})
+    table[path[-1]] = value
+
+
+def _delete(config, path):
+    table = config
+    for key in path[:-1]:
+        table = table.get(key)
+        if not isinstance(table, dict):
+            return
+    table.pop(path[-1], None)
+
+
+def apply_delta(config, delta, reverse=False):
+    """Replay delta on a plain config dict in place; reverse=True undoes it"""
+    added, removed = ('removed', 'added') if reverse else ('added', 'removed')
+    new, target = ('old', 'from') if reverse else ('new', 'to')
+
+    for change in delta[removed]:
+        _delete(config, change['path'])
+    for change in delta['changed']:
+        _set(config, change['path'], _decode(change[new]))
+    for change in delta[added]:
+        _set(config, change['path'], _decode(change['value']))
+
+    # Put added and moved entries of ordered tables back where they belong
+    placed = {}
+    for change in delta[added]:
+        if 'position' in change:
+            placed.setdefault(change['path'][0], []).append((change['position'], change['path'][1]))
+    for change in delta['moved']:
+        placed.setdefault(change['path'][0], []).append((change[target], change['path'][1]))
+    for section, targets in placed.items():
+        table = config[section]
+        moving = {key for _, key in targets}
+        keys = [key for key in table if key not in moving]
+        for position, key in sorted(targets):
+            keys.insert(position, key)
+        config[section] = {key: table[key] for key in keys}
+    return config
+
+
+def summarize(delta):
+    return {kind: len(delta[kind]) for kind in ('added', 'removed', 'changed', 'moved')}
+
+
+# ======================
+# Store
+# ======================
+
+
+class History:
+    """
+    The versions of one config file. index.jsonl has a line per version;
+    NNNNNNNN.delta.gz and NNNNNNNN.toml.gz hold its delta and snapshot.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dir = history_dir(path)
+        self.index_path = os.path.join(self.dir, 'index.jsonl')
+        self.lock = threading.Lock()
+        self.entries = None
+
+    def _file(self, version, kind):
+        return os.path.join(self.dir, f'{version:08d}.{kind}.gz')
+
+    def _load_index(self):
+        if self.entries is not None:
+            return self.entries
+        self.entries = []
+        try:
+            with open(self.index_path) as f:
+                for line in f:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except ValueError:
+                        # A line cut short by a crash; everything before it is fine
+                        break
+        except FileNotFoundError:
+            pass
+        return self.entries
+
+    def _write(self, version, kind, data):
+        blob = gzip.compress(data.encode(), mtime=0)
+        with open(self._file(version, kind), 'wb') as f:
+            f.write(blob)
+        return len(blob)
+
+    def _read(self, version, kind):
+        with open(self._file(version, kind), 'rb') as f:
+            return gzip.decompress(f.read()).decode()
+
+    def _append(self, entry):
+        with open(self.index_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        self.entries.append(entry)
+
+    def record(self, old_text, old_config, new_text, new_config):
+        with self.lock:
+            os.makedirs(self.dir, exist_ok=True)
+            entries = self._load_index()
+            head = entries[-1] if entries else None
+            chained = old_text is not None and head is not None and head['digest'] == _digest(old_text)
+            if old_text is not None and not chained:
+                # Changed outside the app since the last version (or no history yet)
+                self._add(old_text, None, 'external' if head else 'initial', snapshot=True)
+                chained = old_config is not None
+
+            delta = make_delta(old_config, new_config) if chained else None
+            last_snapshot = next((e['version'] for e in reversed(entries) if e['snapshot']), 0)
+            snapshot = delta is None or entries[-1]['version'] + 1 - last_snapshot >= SNAPSHOT_EVERY
+            self._add(new_text, delta, 'save', snapshot)
+            self._retain()
+
+    def _add(self, text, delta, source, snapshot):
+        version = self.entries[-1]['version'] + 1 if self.entries else 1
+        size = 0
+        if delta is not None:
+            size += self._write(version, 'delta', json.dumps(delta))
+        if snapshot:
+            size += self._write(version, 'toml', text)
+        self._append({
+            'version': version,
+            'time': time.time(),
+            'source': source,
+            'digest': _digest(text),
+            'delta': delta is not None,
+            'snapshot': snapshot,
+            'bytes': size,
+            'summary': summarize(delta) if delta is not None else None,
+        })
+
+    def _retain(self):
+        entries = self.entries
+        if len(entries) <= MAX_VERSIONS and sum(e['bytes'] for e in entries) <= MAX_BYTES:
+            return
+        keep_count = max(1, int(MAX_VERSIONS * COMPACT_TO))
+        kept = entries[-keep_count:]
+        while len(kept) > 1 and sum(e['bytes'] for e in kept) > MAX_BYTES * COMPACT_TO:
+            kept = kept[1:]
+
+        first = kept[0]
+        if not first['snapshot']:
+            text = toml_codec.dumps(self._rebuild(first['version']))
+            first['bytes'] += self._write(first['version'], 'toml', text)
+            first['snapshot'] = True
+        if first['delta']:
+            # Its base is about to go
+            first['bytes'] -= os.path.getsize(self._file(first['version'], 'delta'))
+            os.remove(self._file(first['version'], 'delta'))
+            first['delta'] = False
+
+        temp_path = f'{self.index_path}.tmp'
+        with open(temp_path, 'w') as f:
+            f.writelines(json.dumps(entry) + '\n' for entry in kept)
+        os.replace(temp_path, self.index_path)
+        for entry in entries[:len(entries) - len(kept)]:
+            for kind in ('delta', 'toml'):
+                try:
+                    os.remove(self._file(entry['version'], kind))
+                except FileNotFoundError:
+                    pass
+        self.entries = kept
+
+    def _rebuild(self, version):
+        """
+        Config at version, replaying the fewest deltas: forward from a
+        snapshot at or before it, or backward from a later snapshot or the
+        current file.
+        """
+        entries = self._load_index()
+        positions = {entry['version']: i for i, entry in enumerate(entries)}
+        if version not in positions:
+            raise KeyError(version)
+        target = positions[version]
+
+        starts = []
+        # Forward: from the nearest snapshot at or before target, through deltas only
+        for i in range(target, -1, -1):
+            if entries[i]['snapshot']:
+                starts.append((target - i, i))
+                break
+            if not entries[i]['delta']:
+                break
+        # Backward: undoing deltas target+1..i, starting from a snapshot or the current file
+        for i in range(target, len(entries)):
+            if i > target and not entries[i]['delta']:
+                break
+            if entries[i]['snapshot'] or i == len(entries) - 1 and self._head_matches():
+                starts.append((i - target, i))
+                break
+        if not starts:
+            raise KeyError(version)
+        _, start = min(starts)
+
+        if entries[start]['snapshot']:
+            config = toml_codec.loads(self._read(entries[start]['version'], 'toml'))
+        else:
+            with open(self.path) as f:
+                config = toml_codec.loads(f.read())
+        step = 1 if start < target else -1
+        for i in range(start, target, step):
+            if step == 1:
+                apply_delta(config, self._delta(entries[i + 1]['version']))
+            else:
+                apply_delta(config, self._delta(entries[i]['version']), reverse=True)
+        return config
+
+    def _head_matches(self):
+        try:
+            with open(self.path) as f:
+                return _digest(f.read()) == self.entries[-1]['digest']
+        except FileNotFoundError:
+            return False
+
+    def _delta(self, version):
+        return json.loads(self._read(version, 'delta'))
+
+    def versions(self):
+        with self.lock:
+            return list(self._load_index())
+
+    def delta(self, version):
+        with self.lock:
+            return self._delta(version)
+
+    def config(self, version):
+        with self.lock:
+            return self._rebuild(version)
+
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+def history(path):
+    with _histories_lock:
+        store = _histories.get(path)
+        if store is None:
+            store = _histories[path] = History(path)
+        return store
+
+
+def record(path, old_text, old_config, new_text, new_config):
+    """
+    Record a save of new_text (parsed as new_config) over old_text; old_text
+    is None when the file didn't exist. Failures are logged, never raised:
+    history must not stop a save.
+    """
+    if not ENABLED:
+        return
+    try:
+        history(path).record(old_text, old_config, new_text, new_config)
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        logging.getLogger(__name__).warning(f"Could not record config history: {e}")
+
+
+def versions(path):
+    """Recorded versions of path, oldest first"""
+    return history(path).versions()
+
+
+def version_delta(path, version):
+    """The changes version made to the one before it, None if not recorded as a delta"""
+    store = history(path)
+    entry = next((e for e in store.versions() if e['version'] == version), None)
+    if entry is None:
+        raise KeyError(version)
+    return store.delta(version) if entry['delta'] else None
+
+
+def version_config(path, version):
+    """The config as it was at version"""
+    return history(path).config(version)
@@ -1,9 +1,49 @@
-from setuptools import find_packages, setup
+import os
+import subprocess
+import sys
+
+from setuptools import setup
+from setuptools.command.build_py import build_py
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class build_py_with_assets(build_py):
+    """
+    Vendor Bootstrap and Font Awesome (tools/build_assets.py) before
+    building, unless every asset is there already. Offline, point
+    WAYPANEL_ASSETS_DIR at a directory holding the files.
+    """
+
+    def run(self):
+        script = os.path.join(HERE, 'tools', 'build_assets.py')
+        if subprocess.call([sys.executable, script, '--check'], stdout=subprocess.DEVNULL):
+            command = [sys.executable, script]
+            if os.environ.get('WAYPANEL_ASSETS_DIR'):
+                command += ['--from-dir', os.environ['WAYPANEL_ASSETS_DIR']]
+            try:
+                subprocess.check_call(command)
+            except subprocess.CalledProcessError:
+                # Still installable offline; pages then load the assets from the CDNs
+                self.warn('could not vendor the web assets, set WAYPANEL_ASSETS_DIR to a directory holding them')
+        super().run()
+
 
 setup(
     name="waypanel-settings",
     version="1.0",
-    packages=find_packages(),
+    # The repository root is the package
+    package_dir={'waypanel_settings': '.'},
+    packages=['waypanel_settings'],
+    package_data={
+        'waypanel_settings': [
+            'templates/*.html',
+            'templates/*/*.html',
+            'static/vendor/*/*',
+            'static/vendor/*/*/*',
+        ],
+    },
+    cmdclass={'build_py': build_py_with_assets},
     entry_points={
         'console_scripts': [
             'waypanel-settings=waypanel_settings:main'
@@ -0,0 +1,59 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Versions would land next to every test config
+os.environ.setdefault('WAYPANEL_HISTORY', '0')
+
+if 'waypanel_settings' not in sys.modules:
+    # The repository root is the package; load it by path, whatever the checkout is called
+    spec = importlib.util.spec_from_file_location('waypanel_settings', os.path.join(ROOT, '__init__.py'),
+                                                  submodule_search_locations=[ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules['waypanel_settings'] = package
+    spec.loader.exec_module(package)
+
+SAMPLE = '''\
+# waypanel config
+[panel.top]
+height = 32
+enabled = true
+
+[dockbar.firefox]
+cmd = "firefox"
+icon = "firefox"
+name = "Firefox"
+
+[dockbar.term]
+cmd = "kitty"
+icon = "kitty"
+name = "Kitty"
+
+[menu.icons]
+VPN = "network-vpn"
+
+[menu.VPN.item_1]
+name = "Connect"
+cmd = "nmcli up vpn"
+
+[menu.VPN.item_2]
+name = "Disconnect"
+cmd = "nmcli down vpn"
+
+[folders.home]
+name = "Home"
+path = "~"
+filemanager = "nautilus"
+icon = "folder"
+'''
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / 'waypanel.toml'
+    path.write_text(SAMPLE)
+    return str(path)
@@ -0,0 +1,129 @@
+import pytest
+
+from waypanel_settings import core
+
+
+def layer(config):
+    """A throwaway layer over config, as the web app's writer makes them"""
+    return core.ConfigView(config, dirty=set(config._dirty), base=config._base)
+
+
+def test_batch_applies_in_order(config_path):
+    config = core.read_config(config_path, watch=False)
+    results = core.apply_batch(config, [
+        {'op': 'add', 'section': 'dockbar', 'id': 'files', 'value': {'cmd': 'nautilus', 'name': 'Files'}},
+        {'op': 'move', 'section': 'dockbar', 'id': 'files', 'position': 0},
+        {'op': 'edit', 'section': 'folders', 'id': 'home', 'value': {'path': '/home/me'}},
+        {'op': 'add', 'section': 'menu', 'submenu': 'VPN', 'value': {'name': 'Status', 'cmd': 'nmcli'}},
+        {'op': 'delete', 'section': 'menu', 'submenu': 'VPN', 'id': 1},
+        {'op': 'edit', 'section': 'panel', 'id': 'top', 'value': {'height': 40}},
+    ])
+
+    assert results[1] == {'id': 'files', 'position': 0}
+    assert results[3] == {'submenu': 'VPN', 'id': 'item_3'}
+    assert list(config['dockbar']) == ['files', 'firefox', 'term']
+    assert config['dockbar']['files'] == {'cmd': 'nautilus', 'name': 'Files'}
+    assert config['folders']['home']['path'] == '/home/me'
+    assert list(config['menu']['VPN']) == ['item_2', 'item_3']
+    assert config['panel']['top'] == {'height': 40}
+
+
+@pytest.mark.parametrize('operation, message', [
+    ({'op': 'rename', 'section': 'dockbar', 'id': 'term'}, 'Unknown op'),
+    ({'op': 'add', 'section': 'cmd', 'id': 'x', 'value': {}}, 'Unknown section'),
+    ({'op': 'add', 'section': 'dockbar', 'id': 'term', 'value': {'cmd': 'x', 'name': 'x'}}, 'already exists'),
+    ({'op': 'add', 'section': 'dockbar', 'id': 'x', 'value': {'cmd': 'x'}}, 'Missing name'),
+    ({'op': 'delete', 'section': 'folders', 'id': 'nope'}, 'No folders entry'),
+    ({'op': 'move', 'section': 'folders', 'id': 'home', 'position': 0}, 'Only dockbar'),
+    ({'op': 'delete', 'section': 'menu', 'submenu': 'VPN', 'id': 'item_9'}, 'No item'),
+])
+def test_bad_operation_reports_its_index(config_path, operation, message):
+    config = core.read_config(config_path, watch=False)
+    with pytest.raises(core.BatchError, match=message) as info:
+        core.apply_batch(layer(config), [{'op': 'delete', 'section': 'dockbar', 'id': 'firefox'}, operation])
+    assert info.value.index == 1
+    assert 'firefox' in config['dockbar']
+
+
+def test_new_items_are_numbered_after_the_highest(config_path):
+    config = core.read_config(config_path, watch=False)
+    submenu = config['menu']['VPN']
+    index = core.submenu_items('VPN', submenu)
+    del submenu['item_2']
+    # Numbers aren't reused while the index lasts
+    key, = index.allocate()
+    submenu[key] = {'name': 'Status', 'cmd': 'nmcli'}
+    assert key == 'item_3'
+    assert core.submenu_items('VPN', submenu).keys == ['item_1', 'item_3']
+
+    # Items set directly, e.g. by an import, join the index
+    submenu['item_10'] = {'name': 'Edit', 'cmd': 'nm-connection-editor'}
+    index = core.submenu_items('VPN', submenu)
+    assert index.keys == ['item_1', 'item_3', 'item_10']
+    assert index.allocate() == ['item_11']
+
+
+def test_discarded_layer_leaves_the_shared_index_alone(config_path):
+    config = core.read_config(config_path, watch=False)
+    shared = core.submenu_items('VPN', core._config_cache.config['menu']['VPN'])
+    assert shared.keys == ['item_1', 'item_2']
+
+    # Same size before and after, so a size check alone can't tell
+    core.apply_batch(layer(config), [
+        {'op': 'add', 'section': 'menu', 'submenu': 'VPN', 'value': {'name': 'x', 'cmd': 'x'}},
+        {'op': 'delete', 'section': 'menu', 'submenu': 'VPN', 'id': 'item_1'},
+    ])
+    with pytest.raises(core.BatchError):
+        core.apply_batch(layer(config), [
+            {'op': 'add', 'section': 'menu', 'submenu': 'VPN', 'value': {'name': 'x', 'cmd': 'x'}},
+            {'op': 'delete', 'section': 'menu', 'submenu': 'VPN', 'id': 'nope'},
+        ])
+    assert shared.keys == ['item_1', 'item_2']
+
+    # An unrelated save, then the menu is rendered from the new config
+    config['folders'].pop('home')
+    core.write_config(config_path, config)
+    model = core.menu_model(core.read_config(config_path, watch=False))
+    assert [item.name for item in model.get('VPN').items] == ['Connect', 'Disconnect']
+
+    config = core.read_config(config_path, watch=False)
+    results = core.apply_batch(config, [
+        {'op': 'add', 'section': 'menu', 'submenu': 'VPN', 'value': {'name': 'x', 'cmd': 'x'}},
+    ])
+    assert results == [{'submenu': 'VPN', 'id': 'item_3'}]
+
+
+def test_layers_keep_their_own_index(config_path):
+    config = core.read_config(config_path, watch=False)
+    first = layer(config)
+    core.apply_batch(first, [{'op': 'add', 'section': 'menu', 'submenu': 'VPN',
+                              'value': {'name': 'x', 'cmd': 'x'}}])
+    second = layer(first)
+    core.apply_batch(second, [{'op': 'add', 'section': 'menu', 'submenu': 'VPN',
+                               'value': {'name': 'y', 'cmd': 'y'}}])
+
+    assert core.submenu_items('VPN', first['menu']['VPN']).keys == ['item_1', 'item_2', 'item_3']
+    assert core.submenu_items('VPN', second['menu']['VPN']).keys == ['item_1', 'item_2', 'item_3', 'item_4']
+    assert list(config['menu']['VPN']) == ['item_1', 'item_2']
+
+
+def test_records_are_frozen(config_path):
+    item = core.menu_model(core.read_config(config_path, watch=False)).get('VPN').items[0]
+    assert item == core.MenuItem('item_1', 1, 'Connect', 'nmcli up vpn')
+    with pytest.raises(AttributeError):
+        item.name = 'Disconnect'
+
+
+def test_added_items_keep_fields_records_dont_know(config_path):
+    config = core.read_config(config_path, watch=False)
+    core.apply_batch(config, [
+        {'op': 'add', 'section': 'menu', 'submenu': 'VPN',
+         'value': {'name': 'Status', 'cmd': 'nmcli', 'icon': 'network-vpn'}},
+        {'op': 'add', 'section': 'dockbar', 'id': 'files',
+         'value': {'cmd': 'nautilus', 'name': 'Files', 'args': ['-w']}},
+    ])
+    core.write_config(config_path, config)
+
+    saved = core.read_config(config_path, watch=False)
+    assert saved['menu']['VPN']['item_3'] == {'name': 'Status', 'cmd': 'nmcli', 'icon': 'network-vpn'}
+    assert saved['dockbar']['files']['args'] == ['-w']
@@ -0,0 +1,41 @@
+import importlib.util
+import os
+
+import pytest
+
+from conftest import ROOT
+
+spec = importlib.util.spec_from_file_location('build_assets', os.path.join(ROOT, 'tools', 'build_assets.py'))
+build_assets = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(build_assets)
+
+
+@pytest.fixture
+def assets(tmp_path, monkeypatch):
+    """A directory of stand-ins for every asset, and static/vendor pointed into tmp_path"""
+    monkeypatch.setattr(build_assets, 'STATIC', tmp_path / 'static' / 'vendor')
+    source = tmp_path / 'source'
+    source.mkdir()
+    for url in build_assets.ASSETS.values():
+        (source / url.rsplit('/', 1)[-1]).write_bytes(b'.btn{color:red}' if url.endswith('.css') else b'x')
+    return source
+
+
+def test_vendors_every_asset(assets):
+    assert build_assets.main(['--check']) == 1
+    assert build_assets.main(['--from-dir', str(assets)]) == 0
+    assert build_assets.main(['--check']) == 0
+    assert (build_assets.STATIC / 'bootstrap-5.3.2' / 'bootstrap.min.css.gz').is_file()
+
+
+def test_failed_build_leaves_the_old_assets(assets):
+    build_assets.main(['--from-dir', str(assets)])
+    css = build_assets.STATIC / 'bootstrap-5.3.2' / 'bootstrap.min.css'
+    before = css.read_bytes()
+
+    (assets / 'bootstrap.min.css').write_bytes(b'.new{}')
+    (assets / 'fa-solid-900.ttf').unlink()
+    assert build_assets.main(['--from-dir', str(assets)]) == 1
+    assert css.read_bytes() == before
+    assert build_assets.main(['--check']) == 0
+    assert os.listdir(build_assets.STATIC.parent) == ['vendor']
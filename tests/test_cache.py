@@ -0,0 +1,96 @@
+from waypanel_settings import core
+
+
+def test_unchanged_file_is_parsed_once(config_path):
+    first = core.read_config(config_path, watch=False)
+    second = core.read_config(config_path, watch=False)
+    assert first._base is second._base
+    assert first['dockbar']['firefox']['name'] == 'Firefox'
+
+
+def test_external_change_is_reparsed(config_path):
+    core.read_config(config_path, watch=False)
+    with open(config_path, 'a') as f:
+        f.write('\n[folders.docs]\nname = "Docs"\npath = "~/Documents"\n')
+    config = core.read_config(config_path, watch=False)
+    assert config['folders']['docs']['name'] == 'Docs'
+
+
+def test_edits_stay_in_the_view(config_path):
+    config = core.read_config(config_path, watch=False)
+    config['dockbar']['firefox']['name'] = 'Firefox ESR'
+    assert core.read_config(config_path, watch=False)['dockbar']['firefox']['name'] == 'Firefox'
+
+
+def test_saved_config_becomes_the_cached_one(config_path):
+    config = core.read_config(config_path, watch=False)
+    model = core.menu_model(config)
+    del config['menu']['VPN']['item_1']
+    assert core.write_config(config_path, config)
+
+    config = core.read_config(config_path, watch=False)
+    assert config._base is core._config_cache.config
+    assert list(config['menu']['VPN']) == ['item_2']
+    # Derived data is rebuilt for the new config
+    assert core.menu_model(config) is not model
+    assert [item.key for item in core.menu_model(config).get('VPN').items] == ['item_2']
+
+
+def test_noop_save_is_skipped(config_path):
+    config = core.read_config(config_path, watch=False)
+    config['dockbar']['firefox']['name'] = 'Firefox'
+    assert not core.write_config(config_path, config)
+
+
+def test_first_save_creates_the_config_dir(tmp_path):
+    path = str(tmp_path / 'new' / 'waypanel.toml')
+    config = core.read_config(path, watch=False)
+    config['folders']['home'] = {'name': 'Home', 'path': '~'}
+    assert core.write_config(path, config)
+    assert core.read_config(path, watch=False)['folders']['home']['path'] == '~'
+
+
+def test_save_to_a_bare_file_name(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = core.read_config('waypanel.toml', watch=False)
+    config['folders']['home'] = {'name': 'Home', 'path': '~'}
+    assert core.write_config('waypanel.toml', config)
+    assert core.read_config(str(tmp_path / 'waypanel.toml'), watch=False)['folders']['home']['path'] == '~'
+
+
+def test_save_splices_untouched_sections_verbatim(config_path):
+    with open(config_path, 'a') as f:
+        f.write('\n[folders.docs]  # kept as written\nname="Docs"\npath = "~/Documents"\n')
+    with open(config_path) as f:
+        before = f.read()
+
+    config = core.read_config(config_path, watch=False)
+    config['dockbar']['firefox']['name'] = 'Firefox ESR'
+    core.write_config(config_path, config)
+
+    with open(config_path) as f:
+        after = f.read()
+    assert after == before.replace('name = "Firefox"', 'name = "Firefox ESR"')
+
+
+def test_save_drops_removed_sections(config_path):
+    config = core.read_config(config_path, watch=False)
+    del config['menu']['VPN']['item_1']
+    core.write_config(config_path, config)
+
+    with open(config_path) as f:
+        text = f.read()
+    assert '[menu.VPN.item_1]' not in text
+    assert text.startswith('# waypanel config\n[panel.top]\n')
+    assert text.endswith('[folders.home]\nname = "Home"\npath = "~"\nfilemanager = "nautilus"\nicon = "folder"\n')
+
+
+def test_own_write_is_recognized(config_path):
+    config = core.read_config(config_path, watch=False)
+    config['dockbar']['term']['name'] = 'Terminal'
+    core.write_config(config_path, config)
+    assert core._config_cache.own_write(config_path)
+
+    with open(config_path, 'a') as f:
+        f.write('\n[cmd]\n')
+    assert not core._config_cache.own_write(config_path)
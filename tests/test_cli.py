@@ -0,0 +1,12 @@
+from waypanel_settings import cli, core
+
+
+def test_set_in_the_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert cli.main(['--config', 'waypanel.toml', 'set', 'panel.top.height', '40']) == 0
+    assert core.read_config(str(tmp_path / 'waypanel.toml'), watch=False)['panel']['top']['height'] == 40
+
+
+def test_file_errors_are_reported(config_path, capsys):
+    assert cli.main(['--config', config_path, 'import', config_path + '.missing']) == 1
+    assert capsys.readouterr().err == f'waypanel-settings: {config_path}.missing: No such file or directory\n'
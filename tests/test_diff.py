@@ -0,0 +1,46 @@
+from waypanel_settings import core
+
+
+def test_diff_of_a_view_against_its_base(config_path):
+    base = core.read_config(config_path, watch=False)
+    config = core.read_config(config_path, watch=False)
+    config['dockbar']['firefox']['name'] = 'Firefox ESR'
+    del config['folders']['home']
+    config['folders']['docs'] = {'name': 'Docs', 'path': '~/Documents'}
+
+    diff = core.diff_configs(base, config)
+    assert diff['changed'] == [{'path': ['dockbar', 'firefox', 'name'], 'old': 'Firefox', 'new': 'Firefox ESR'}]
+    assert [change['path'] for change in diff['removed']] == [['folders', 'home']]
+    assert diff['added'] == [{'path': ['folders', 'docs'], 'value': {'name': 'Docs', 'path': '~/Documents'}}]
+    assert diff['moved'] == []
+
+
+def test_dock_moves_are_reported(config_path):
+    base = core.read_config(config_path, watch=False)
+    config = core.read_config(config_path, watch=False)
+    order = core.DockOrder(config['dockbar'])
+    order.move('term', 0)
+    order.apply(config)
+
+    diff = core.diff_configs(base, config)
+    assert diff['moved'] == [{'path': ['dockbar', 'term'], 'from': 1, 'to': 0}]
+    assert not diff['added'] and not diff['removed'] and not diff['changed']
+
+
+def test_values_of_different_types_differ():
+    assert not core.same_config({'a': 1}, {'a': 1.0})
+    assert not core.same_config({'a': 1}, {'a': True})
+    assert not core.same_config({'a': '1'}, {'a': 1})
+    assert not core.same_config({'a': ['x', 'y']}, {'a': ['xy']})
+    assert not core.same_config({'a': 1, 'b': 2}, {'b': 2, 'a': 1})
+    assert core.same_config({'a': {'b': [1, {'c': 'd'}]}}, {'a': {'b': [1, {'c': 'd'}]}})
+
+
+def test_section_hashes_follow_content(config_path):
+    config = core.read_config(config_path, watch=False)
+    hashes = core.section_hashes(config)
+    config['dockbar']['firefox']['name'] = 'Firefox ESR'
+    core.write_config(config_path, config)
+
+    changed = core.section_hashes(core.read_config(config_path, watch=False))
+    assert [name for name in hashes if hashes[name] != changed[name]] == ['dockbar']
@@ -0,0 +1,146 @@
+import asyncio
+import os
+
+import pytest
+
+from waypanel_settings import core, history, toml_codec
+from waypanel_settings import waypanel_settings as web
+
+
+@pytest.fixture
+def recorded(config_path, monkeypatch):
+    """config_path, with history turned on for it"""
+    monkeypatch.setattr(history, 'ENABLED', True)
+    return config_path
+
+
+def load(path):
+    with open(path) as f:
+        return toml_codec.loads(f.read())
+
+
+def save(path, *mutations):
+    """Apply mutations and save; returns the version recorded and the config written"""
+    config = core.read_config(path, watch=False)
+    for mutate in mutations:
+        mutate(config)
+    assert core.write_config(path, config)
+    return history.versions(path)[-1]['version'], load(path)
+
+
+def rename(name):
+    return lambda config: config['dockbar']['firefox'].update(name=name)
+
+
+def move(key, position):
+    def mutate(config):
+        order = core.DockOrder(config['dockbar'])
+        order.move(key, position)
+        order.apply(config)
+    return mutate
+
+
+def stored_files(path):
+    return sorted(os.listdir(history.history_dir(path)))
+
+
+def test_saves_are_recorded_as_deltas(recorded):
+    initial = load(recorded)
+    _, first = save(recorded, rename('Firefox ESR'))
+    _, second = save(recorded, lambda config: config['folders'].pop('home'))
+
+    entries = history.versions(recorded)
+    assert [(e['version'], e['source'], e['delta'], e['snapshot']) for e in entries] == [
+        (1, 'initial', False, True), (2, 'save', True, False), (3, 'save', True, False)]
+    assert stored_files(recorded) == ['00000001.toml.gz', '00000002.delta.gz', '00000003.delta.gz',
+                                      'index.jsonl']
+    assert history.version_delta(recorded, 2)['changed'] == [
+        {'path': ['dockbar', 'firefox', 'name'], 'old': '"Firefox"', 'new': '"Firefox ESR"'}]
+    assert entries[2]['summary'] == {'added': 0, 'removed': 1, 'changed': 0, 'moved': 0}
+    assert history.version_delta(recorded, 1) is None
+
+    assert history.version_config(recorded, 1) == initial
+    assert history.version_config(recorded, 2) == first
+    assert history.version_config(recorded, 3) == second
+
+
+def test_every_version_rebuilds(recorded, monkeypatch):
+    monkeypatch.setattr(history, 'SNAPSHOT_EVERY', 4)
+    saved = {1: load(recorded)}
+    for i in range(12):
+        if i == 7:
+            # An edit behind the app's back is stored whole
+            with open(recorded, 'a') as f:
+                f.write('\n[folders.docs]\nname = "Docs"\npath = "~/Documents"\n')
+            core._config_cache.invalidate(recorded)
+            saved[len(saved) + 1] = load(recorded)
+        version, config = save(recorded, rename(f'Firefox {i}'), move('term', i % 2))
+        saved[version] = config
+
+    entries = history.versions(recorded)
+    assert [e['version'] for e in entries] == list(saved)
+    assert [e['version'] for e in entries if e['snapshot']] == [1, 5, 9, 13]
+    assert entries[8]['source'] == 'external'
+    for version, config in saved.items():
+        rebuilt = history.version_config(recorded, version)
+        assert rebuilt == config
+        assert list(rebuilt['dockbar']) == list(config['dockbar'])
+
+
+def test_rollback_to_an_older_version(recorded, monkeypatch):
+    monkeypatch.setitem(web.app.config, 'CONFIG_PATH', recorded)
+    monkeypatch.setitem(web.app.config, 'OFFLOAD_IO', False)
+    version, old = save(recorded, rename('Firefox ESR'))
+    save(recorded, move('term', 0))
+    save(recorded, lambda config: config['folders'].pop('home'))
+
+    async def rollback():
+        client = web.app.test_client()
+        response = await client.post(f'/history/{version}/rollback', headers={'Accept': 'application/json'})
+        return await response.get_json()
+
+    assert asyncio.run(rollback())['success']
+    assert load(recorded) == old
+    assert list(load(recorded)['dockbar']) == ['firefox', 'term']
+    # The rollback is a version of its own, undoing the two after it
+    entries = history.versions(recorded)
+    assert entries[-1]['version'] == version + 3 and entries[-1]['source'] == 'save'
+    assert entries[-1]['summary'] == {'added': 1, 'removed': 0, 'changed': 0, 'moved': 1}
+    assert history.version_config(recorded, version + 2) != old
+
+
+def test_retention_bounds_versions_and_disk_usage(recorded, monkeypatch):
+    monkeypatch.setattr(history, 'SNAPSHOT_EVERY', 5)
+    monkeypatch.setattr(history, 'MAX_VERSIONS', 10)
+    saved = {}
+    for i in range(40):
+        version, config = save(recorded, rename(f'Firefox {i}'))
+        saved[version] = config
+        assert len(history.versions(recorded)) <= 10
+
+    entries = history.versions(recorded)
+    assert entries[-1]['version'] == 41
+    # Compacted: the oldest kept version stands on its own, and only kept versions have files
+    assert entries[0]['snapshot'] and not entries[0]['delta']
+    files = ([f'{e["version"]:08d}.delta.gz' for e in entries if e['delta']]
+             + [f'{e["version"]:08d}.toml.gz' for e in entries if e['snapshot']])
+    assert stored_files(recorded) == sorted(files + ['index.jsonl'])
+    directory = history.history_dir(recorded)
+    stored = sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+    assert stored == sum(e['bytes'] for e in entries)
+    for entry in entries:
+        assert history.version_config(recorded, entry['version']) == saved[entry['version']]
+
+
+def test_retention_bounds_bytes(recorded, monkeypatch):
+    monkeypatch.setattr(history, 'MAX_BYTES', 4096)
+    for _ in range(30):
+        # Incompressible, so every version costs about the same
+        save(recorded, lambda config: config['panel']['top'].update(note=os.urandom(200).hex()))
+        assert sum(e['bytes'] for e in history.versions(recorded)) <= 4096
+
+    directory = history.history_dir(recorded)
+    stored = sum(os.path.getsize(os.path.join(directory, name))
+                 for name in stored_files(recorded) if name != 'index.jsonl')
+    assert stored <= 4096
+    assert history.versions(recorded)[-1]['version'] == 31
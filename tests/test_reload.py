@@ -0,0 +1,189 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import pytest
+
+from waypanel_settings import waypanel_settings as web
+
+# A stand-in for waypanel: 'ignore' ignores the reload signal, 'reload'
+# re-reads the config on it, holding the file open for a moment
+DUMMY = '''\
+#!{python}
+import os, signal, sys, time
+
+def reload(signum, frame):
+    with open(os.environ['WAYPANEL_CONFIG']) as f:
+        f.read()
+        time.sleep(0.3)
+
+mode = sys.argv[1] if len(sys.argv) > 1 else ''
+if mode == 'ignore':
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+elif mode == 'reload':
+    signal.signal(signal.SIGHUP, reload)
+while True:
+    time.sleep(1)
+'''
+
+
+class Dummy:
+    """An executable stand-in for waypanel with a name of its own, and the copies started of it"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = path.name
+        self.processes = []
+
+    def __str__(self):
+        return str(self.path)
+
+    def start(self, *args):
+        process = subprocess.Popen([str(self.path), *args], start_new_session=True)
+        self.processes.append(process)
+        return process
+
+
+@pytest.fixture
+def dummy(tmp_path, config_path, monkeypatch):
+    path = tmp_path / f'wp{uuid.uuid4().hex[:8]}'
+    path.write_text(DUMMY.format(python=sys.executable))
+    path.chmod(0o755)
+    monkeypatch.setenv('WAYPANEL_CONFIG', config_path)
+    monkeypatch.setitem(web.app.config, 'CONFIG_PATH', config_path)
+    monkeypatch.setitem(web.app.config, 'OFFLOAD_IO', False)
+    monkeypatch.setitem(web.app.config, 'RELOAD_STOP_TIMEOUT', 0.5)
+    monkeypatch.setitem(web.app.config, 'RELOAD_SETTLE', 0.1)
+    monkeypatch.setitem(web.app.config, 'RELOAD_READY_TIMEOUT', 5.0)
+    monkeypatch.setitem(web.app.config, 'RELOAD_ACK_TIMEOUT', 1.0)
+    dummy = Dummy(path)
+    yield dummy
+    for process in dummy.processes:
+        process.kill()
+        process.wait()
+    for pid in web.find_processes(dummy.name):
+        os.kill(pid, 9)
+
+
+def wait_for_pids(name, count):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        pids = web.find_processes(name)
+        if len(pids) >= count:
+            return pids
+        time.sleep(0.02)
+    return web.find_processes(name)
+
+
+@pytest.mark.parametrize('argv, program', [
+    (['/usr/bin/waypanel'], 'waypanel'),
+    (['python3', '/usr/bin/waypanel'], 'waypanel'),
+    (['/usr/bin/python3.12', '-u', '/usr/bin/waypanel', '--debug'], 'waypanel'),
+    (['python3', '-m', 'waypanel'], 'waypanel'),
+    (['sh', '/home/me/bin/waypanel'], 'waypanel'),
+    (['vim', '/home/me/bin/waypanel'], 'vim'),
+    (['less', 'waypanel'], 'less'),
+    (['tail', '-f', '/home/me/.local/state/waypanel'], 'tail'),
+    ([], None),
+])
+def test_running_program(argv, program):
+    assert web.running_program(argv) == program
+
+
+def test_find_processes_skips_files_named_like_it(dummy):
+    process = dummy.start()
+    viewer = subprocess.Popen(['tail', str(dummy), '-f'], stdout=subprocess.DEVNULL)
+    try:
+        assert wait_for_pids(dummy.name, 1) == [process.pid]
+        time.sleep(0.1)
+        assert web.find_processes(dummy.name) == [process.pid]
+    finally:
+        viewer.kill()
+        viewer.wait()
+
+
+def test_unacknowledged_signal_falls_back_to_a_restart(dummy, monkeypatch):
+    monkeypatch.setitem(web.app.config, 'WAYPANEL_COMMAND', [str(dummy), 'ignore'])
+    monkeypatch.setitem(web.app.config, 'RELOAD_MODE', 'signal')
+    old = dummy.start('ignore')
+    wait_for_pids(dummy.name, 1)
+
+    async def reload():
+        supervisor = web.ReloadSupervisor()
+        supervisor._bind()
+        try:
+            return await supervisor.reload()
+        finally:
+            if supervisor.process is not None and supervisor.process.returncode is None:
+                supervisor.process.kill()
+                await supervisor.process.wait()
+
+    result = asyncio.run(reload())
+    assert result['success'] and result['fallback'] and result['mode'] == 'restart'
+    assert result['pid'] != old.pid
+    assert old.wait(1) is not None
+
+
+def test_stop_gives_up_on_a_process_that_never_exits(dummy):
+    class Stuck:
+        """A child stuck in the kernel: SIGKILL doesn't reap it and wait() never returns"""
+        returncode = None
+
+        def __init__(self, pid):
+            self.pid = pid
+
+        async def wait(self):
+            await asyncio.Event().wait()
+
+    gone = subprocess.Popen(['true'])
+    gone.wait()
+
+    async def stop():
+        supervisor = web.ReloadSupervisor()
+        supervisor._bind()
+        supervisor.process = Stuck(gone.pid)
+        started = time.monotonic()
+        await supervisor.stop(dummy.name)
+        return time.monotonic() - started
+
+    assert asyncio.run(stop()) < 2
+
+
+def signal_reload(meanwhile=None):
+    async def run():
+        supervisor = web.ReloadSupervisor()
+        supervisor._bind()
+        if meanwhile is not None:
+            await meanwhile()
+        return await supervisor.send_signal()
+    return asyncio.run(run())
+
+
+def test_signal_is_acknowledged_by_reading_the_config(dummy, monkeypatch):
+    monkeypatch.setitem(web.app.config, 'WAYPANEL_COMMAND', [str(dummy), 'reload'])
+    dummy.start('reload')
+    wait_for_pids(dummy.name, 1)
+    # Let it install its handler
+    time.sleep(0.3)
+    assert signal_reload() is True
+
+
+def test_other_readers_of_the_config_are_no_acknowledgement(dummy, monkeypatch):
+    monkeypatch.setitem(web.app.config, 'WAYPANEL_COMMAND', [str(dummy), 'ignore'])
+    old = dummy.start('ignore')
+    wait_for_pids(dummy.name, 1)
+    time.sleep(0.3)
+
+    async def read_config_meanwhile():
+        async def read():
+            for _ in range(10):
+                with open(web.app.config['CONFIG_PATH']) as f:
+                    f.read()
+                await asyncio.sleep(0.05)
+        asyncio.get_running_loop().create_task(read())
+
+    assert signal_reload(read_config_meanwhile) is False
+    assert old.poll() is None
@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+from waypanel_settings import core
+
+
+def export(config, fmt, sections=core.TRANSFER_SECTIONS):
+    return ''.join(core.dump_entries(core.config_entries(config, sections), fmt))
+
+
+def read(text, fmt, chunk_size=7):
+    """Entries of text fed to an EntryReader a few characters at a time"""
+    return list(core.read_entries((text[i:i + chunk_size] for i in range(0, len(text), chunk_size)), fmt))
+
+
+def test_export_jsonl(config_path):
+    lines = export(core.read_config(config_path, watch=False), 'jsonl').splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'section': 'dockbar', 'id': 'firefox', 'value': {'cmd': 'firefox', 'icon': 'firefox', 'name': 'Firefox'}},
+        {'section': 'dockbar', 'id': 'term', 'value': {'cmd': 'kitty', 'icon': 'kitty', 'name': 'Kitty'}},
+        {'section': 'folders', 'id': 'home',
+         'value': {'name': 'Home', 'path': '~', 'filemanager': 'nautilus', 'icon': 'folder'}},
+        {'section': 'menu', 'submenu': 'VPN', 'id': 'item_1', 'value': {'name': 'Connect', 'cmd': 'nmcli up vpn'}},
+        {'section': 'menu', 'submenu': 'VPN', 'id': 'item_2',
+         'value': {'name': 'Disconnect', 'cmd': 'nmcli down vpn'}},
+    ]
+
+
+@pytest.mark.parametrize('fmt', core.TRANSFER_FORMATS)
+def test_export_reads_back(config_path, fmt):
+    config = core.read_config(config_path, watch=False)
+    entries = read(export(config, fmt), fmt)
+    assert [entry[:3] for entry in entries] == [
+        ('dockbar', None, 'firefox'), ('dockbar', None, 'term'), ('folders', None, 'home'),
+        ('menu', 'VPN', 'item_1'), ('menu', 'VPN', 'item_2'),
+    ]
+    assert entries[3][3] == {'name': 'Connect', 'cmd': 'nmcli up vpn'}
+
+
+def test_whole_config_reads_as_toml(config_path):
+    with open(config_path) as f:
+        text = f.read()
+    entries = read(text, 'toml', chunk_size=3)
+    # [panel] and [menu.icons] aren't entries
+    assert len(entries) == 5
+
+
+def test_toml_strings_that_look_like_headers():
+    text = ('[dockbar.notes]\ncmd = """\n[dockbar.fake]\n"""\nname = "Notes"\n\n'
+            '[dockbar.list]\ncmd = "x"\nname = "y"\nargs = [\n  "[dockbar.nope]",\n]\n')
+    assert [entry[2] for entry in read(text, 'toml')] == ['notes', 'list']
+
+
+def test_list_style_submenus():
+    text = '[[menu.Apps]]\nname = "Files"\ncmd = "nautilus"\n\n[[menu.Apps]]\nname = "Web"\ncmd = "firefox"\n'
+    entries = read(text, 'toml')
+    assert [(entry[1], entry[2], entry[3]['name']) for entry in entries] == [('Apps', None, 'Files'),
+                                                                            ('Apps', None, 'Web')]
+
+
+@pytest.mark.parametrize('text, message', [
+    ('{"section": "dockbar", "id": "x", "value": {"cmd": "x"}}\n', 'Line 1: dockbar entry .x.: Missing name'),
+    ('\n{"section": "cmd", "id": "x", "value": {}}\n', 'Line 2: Unknown section'),
+    ('{"section": "menu", "submenu": "VPN", "id": "first", "value": {"name": "a", "cmd": "b"}}\n',
+     'Line 1: Menu item ids look like item_1'),
+    ('{"section": "folders"\n', 'Line 1: '),
+])
+def test_bad_jsonl(text, message):
+    with pytest.raises(core.TransferError, match=message):
+        read(text, 'jsonl')
+
+
+def test_bad_toml_reports_where_the_entry_starts():
+    text = '[dockbar.a]\ncmd = "a"\nname = "a"\n\n[dockbar.b]\ncmd = "b"\nname = \n'
+    with pytest.raises(core.TransferError, match='Line 5: '):
+        read(text, 'toml')
+
+
+def test_import_merges(config_path):
+    config = core.read_config(config_path, watch=False)
+    entries = read(
+        '{"section": "dockbar", "id": "term", "value": {"cmd": "foot", "name": "Foot"}}\n'
+        '{"section": "dockbar", "id": "files", "value": {"cmd": "nautilus", "name": "Files"}}\n'
+        '{"section": "menu", "submenu": "VPN", "value": {"name": "Status", "cmd": "nmcli"}}\n'
+        '{"section": "menu", "submenu": "Power", "value": {"name": "Off", "cmd": "poweroff"}}\n', 'jsonl')
+    counts = core.import_entries(config, entries)
+
+    assert counts == {'dockbar': 2, 'folders': 0, 'menu': 2}
+    assert list(config['dockbar']) == ['firefox', 'term', 'files']
+    assert config['dockbar']['term'] == {'cmd': 'foot', 'name': 'Foot'}
+    assert list(config['menu']['VPN']) == ['item_1', 'item_2', 'item_3']
+    assert config['menu']['Power'] == {'item_1': {'name': 'Off', 'cmd': 'poweroff'}}
+
+
+def test_import_replaces(config_path):
+    config = core.read_config(config_path, watch=False)
+    entries = read('[dockbar.files]\ncmd = "nautilus"\nname = "Files"\n'
+                   '[menu.Power.item_5]\nname = "Off"\ncmd = "poweroff"\n', 'toml')
+    core.import_entries(config, entries, replace=('dockbar', 'menu'))
+
+    assert list(config['dockbar']) == ['files']
+    assert list(config['menu']) == ['icons', 'Power']
+    assert list(config['folders']) == ['home']
+
+    core.write_config(config_path, config)
+    saved = core.read_config(config_path, watch=False)
+    assert export(saved, 'toml', ('dockbar', 'menu')) == (
+        '[dockbar.files]\ncmd = "nautilus"\nname = "Files"\n\n'
+        '[menu.Power.item_5]\nname = "Off"\ncmd = "poweroff"\n')
+
+
+@pytest.mark.parametrize('fmt', core.TRANSFER_FORMATS)
+def test_import_keeps_fields_records_dont_know(config_path, fmt):
+    config = core.read_config(config_path, watch=False)
+    config['menu']['VPN']['item_1']['icon'] = 'network-vpn'
+    config['dockbar']['term']['args'] = ['--single-instance']
+    text = export(config, fmt)
+
+    imported = core.read_config(config_path, watch=False)
+    core.import_entries(imported, read(text, fmt), replace=core.TRANSFER_SECTIONS)
+    core.write_config(config_path, imported)
+    saved = core.read_config(config_path, watch=False)
+    assert saved['menu']['VPN']['item_1'] == {'name': 'Connect', 'cmd': 'nmcli up vpn', 'icon': 'network-vpn'}
+    assert saved['dockbar']['term']['args'] == ['--single-instance']
+    assert export(saved, fmt) == text
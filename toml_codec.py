@@ -0,0 +1,259 @@
+"""
+TOML codec for the waypanel config.
+
+Picks the fastest available backend at import time: ``tomli`` (its compiled
+wheels parse several times faster than stdlib ``tomllib``) or ``tomllib`` for
+reading, and a built-in emitter for writing. The emitter produces the same bytes
+as ``tomli_w`` for everything the settings app writes, so switching writer
+backends never churns the file and ``dumps(loads(dumps(config)))`` is
+byte-identical to ``dumps(config)``.
+
+Backends can be forced with WAYPANEL_TOML_READER / WAYPANEL_TOML_WRITER or
+set_backend(), which the benchmarks use to compare them.
+"""
+import importlib
+import os
+import re
+from collections.abc import Mapping
+from datetime import date, datetime, time
+
+__all__ = ['TOMLDecodeError', 'loads', 'dumps', 'dumps_table', 'format_value', 'set_backend',
+           'available_readers', 'available_writers', 'reader_name', 'writer_name']
+
+
+class TOMLDecodeError(ValueError):
+    """Raised by loads() regardless of which reader backend is in use"""
+
+
+# ======================
+# Built-in Emitter
+# ======================
+
+_BARE_KEY_RE = re.compile(r'[A-Za-z0-9_-]+')
+_ILLEGAL_STR_RE = re.compile(r'[\x00-\x08\x0a-\x1f\x7f"\\]')
+_COMPACT_ESCAPES = {
+    '\b': '\\b',
+    '\n': '\\n',
+    '\f': '\\f',
+    '\r': '\\r',
+    '"': '\\"',
+    '\\': '\\\\',
+}
+ARRAY_INDENT = ' ' * 4
+MAX_LINE_LENGTH = 100
+
+
+def _escape_char(match):
+    char = match.group()
+    return _COMPACT_ESCAPES.get(char) or '\\u' + format(ord(char), '04x')
+
+
+def _format_string(value):
+    if _ILLEGAL_STR_RE.search(value) is None:
+        return f'"{value}"'
+    return '"' + _ILLEGAL_STR_RE.sub(_escape_char, value) + '"'
+
+
+def _format_key(key):
+    if not isinstance(key, str):
+        raise TypeError(f"Invalid mapping key '{key}' of type '{type(key).__qualname__}'."
+                        " A string is required.")
+    if _BARE_KEY_RE.fullmatch(key):
+        return key
+    return _format_string(key)
+
+
+def _format_literal(value, nest_level=0):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, str):
+        return _format_string(value)
+    if isinstance(value, (int, float, date, datetime)):
+        return str(value)
+    if isinstance(value, time):
+        if value.tzinfo:
+            raise ValueError("TOML does not support offset times")
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return '[]'
+        item_indent = ARRAY_INDENT * (nest_level + 1)
+        items = ',\n'.join(item_indent + _format_literal(item, nest_level + 1) for item in value)
+        return f'[\n{items},\n{ARRAY_INDENT * nest_level}]'
+    if isinstance(value, Mapping):
+        return _format_inline_table(value)
+    raise TypeError(f"Object of type '{type(value).__qualname__}' is not TOML serializable")
+
+
+def _format_inline_table(table):
+    if not table:
+        return '{}'
+    return '{ ' + ', '.join(f'{_format_key(k)} = {_format_literal(v)}' for k, v in table.items()) + ' }'
+
+
+def _is_aot(value):
+    return isinstance(value, (list, tuple)) and bool(value) and all(isinstance(v, Mapping) for v in value)
+
+
+def _fits_inline(table):
+    rendered = f'{ARRAY_INDENT}{_format_inline_table(table)},'
+    return len(rendered) <= MAX_LINE_LENGTH and '\n' not in rendered
+
+
+def _emit_table(out, table, name, inside_aot=False):
+    written = False
+    literals = []
+    tables = []
+    for key, value in table.items():
+        if isinstance(value, Mapping):
+            tables.append((key, value, False))
+        elif _is_aot(value) and not all(_fits_inline(t) for t in value):
+            tables.extend((key, t, True) for t in value)
+        else:
+            literals.append((key, value))
+
+    if inside_aot or name and (literals or not tables):
+        written = True
+        out.append(f'[[{name}]]\n' if inside_aot else f'[{name}]\n')
+
+    if literals:
+        written = True
+        out.extend(f'{_format_key(k)} = {_format_literal(v)}\n' for k, v in literals)
+
+    for key, value, in_aot in tables:
+        if written:
+            out.append('\n')
+        written = True
+        key_part = _format_key(key)
+        _emit_table(out, value, f'{name}.{key_part}' if name else key_part, in_aot)
+
+
+def _builtin_dumps(config):
+    out = []
+    _emit_table(out, config, '')
+    return ''.join(out)
+
+
+# ======================
+# Backend Selection
+# ======================
+
+
+def _tomllib_reader(module_name):
+    module = importlib.import_module(module_name)
+    return module.loads, module.TOMLDecodeError
+
+
+def _toml_reader():
+    module = importlib.import_module('toml')
+    return module.loads, module.TomlDecodeError
+
+
+def _tomli_w_writer():
+    return importlib.import_module('tomli_w').dumps
+
+
+def _toml_writer():
+    return importlib.import_module('toml').dumps
+
+
+# Ordered fastest first
+READERS = {
+    'tomli': lambda: _tomllib_reader('tomli'),
+    'tomllib': lambda: _tomllib_reader('tomllib'),
+    'toml': _toml_reader,
+}
+WRITERS = {
+    'builtin': lambda: _builtin_dumps,
+    'tomli_w': _tomli_w_writer,
+    'toml': _toml_writer,
+}
+
+_reader = None
+_reader_errors = ()
+_writer = None
+_reader_name = None
+_writer_name = None
+
+
+def available_readers():
+    names = []
+    for name, factory in READERS.items():
+        try:
+            factory()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def available_writers():
+    names = []
+    for name, factory in WRITERS.items():
+        try:
+            factory()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def set_backend(reader=None, writer=None):
+    """Switch the reader and/or writer backend, e.g. set_backend(reader='tomli')"""
+    global _reader, _reader_errors, _writer, _reader_name, _writer_name
+    if reader is not None:
+        _reader, _reader_errors = READERS[reader]()
+        _reader_name = reader
+    if writer is not None:
+        _writer = WRITERS[writer]()
+        _writer_name = writer
+
+
+def _select(registry, preferred):
+    names = [preferred] if preferred else []
+    names += [name for name in registry if name != preferred]
+    for name in names:
+        try:
+            registry[name]()
+        except (ImportError, KeyError):
+            continue
+        return name
+    raise ImportError(f"No TOML backend available, tried: {', '.join(names)}")
+
+
+def reader_name():
+    return _reader_name
+
+
+def writer_name():
+    return _writer_name
+
+
+def loads(text):
+    try:
+        return _reader(text)
+    except _reader_errors as e:
+        raise TOMLDecodeError(str(e)) from e
+
+
+def dumps(config):
+    return _writer(config)
+
+
+def format_value(value):
+    """TOML literal for a single value, e.g. for printing one key"""
+    return _format_literal(value)
+
+
+def dumps_table(path, table, array=False):
+    """
+    table on its own under a [path] header, or [[path]] for an item of an
+    array of tables, e.g. to write a config out one entry at a time
+    """
+    out = []
+    _emit_table(out, table, '.'.join(_format_key(key) for key in path), inside_aot=array)
+    return ''.join(out)
+
+
+set_backend(reader=_select(READERS, os.environ.get('WAYPANEL_TOML_READER')),
+            writer=_select(WRITERS, os.environ.get('WAYPANEL_TOML_WRITER')))
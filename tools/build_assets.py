@@ -0,0 +1,245 @@
+"""
+Vendor Bootstrap and Font Awesome into static/vendor for offline use.
+
+Downloads the exact versions base.html used to load from the CDNs (or copies
+them from --from-dir on machines without network access), trims the
+Bootstrap stylesheet to the classes the templates use, and writes .gz and,
+when the brotli module is installed, .br siblings that the app serves to
+clients accepting them.
+
+    python tools/build_assets.py
+    python tools/build_assets.py --from-dir ~/Downloads/assets --no-trim
+    python tools/build_assets.py --check
+
+Font Awesome is not trimmed: dockbar icons are named in the config, so any
+icon class can show up at runtime.
+"""
+import argparse
+import gzip
+import os
+import re
+import shutil
+import sys
+import tempfile
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+STATIC = ROOT / 'static' / 'vendor'
+TEMPLATES = ROOT / 'templates'
+
+BOOTSTRAP = 'bootstrap-5.3.2'
+FONTAWESOME = 'fontawesome-6.4.0'
+FA_URL = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0'
+
+# target path under static/vendor -> source URL
+ASSETS = {
+    f'{BOOTSTRAP}/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/css/bootstrap.min.css',
+    f'{BOOTSTRAP}/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
+    f'{FONTAWESOME}/css/all.min.css': f'{FA_URL}/css/all.min.css',
+}
+for font in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility'):
+    for ext in ('woff2', 'ttf'):
+        ASSETS[f'{FONTAWESOME}/webfonts/{font}.{ext}'] = f'{FA_URL}/webfonts/{font}.{ext}'
+
+TRIMMED = {f'{BOOTSTRAP}/bootstrap.min.css'}
+COMPRESSIBLE = ('.css', '.js', '.ttf')
+
+# Classes Bootstrap's JS adds at runtime, never spelled out in the templates
+SAFELIST = {'show', 'showing', 'hiding', 'fade', 'collapse', 'collapsing', 'collapsed', 'active',
+            'disabled', 'modal-open', 'modal-backdrop', 'offcanvas-backdrop', 'dropdown-menu-end'}
+SAFE_PREFIXES = ('tooltip', 'popover', 'bs-tooltip', 'bs-popover')
+
+
+# ======================
+# CSS Trimming
+# ======================
+
+_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+_NOT_RE = re.compile(r':not\([^()]*\)')
+_WORD_RE = re.compile(r'[A-Za-z][\w-]*')
+_PREFIX_RE = re.compile(r'([A-Za-z][\w-]*-)\{\{')
+
+
+def used_classes(templates=TEMPLATES):
+    """
+    Every word in the templates, which covers class attributes and class
+    names in scripts, plus prefixes of classes built in Jinja such as
+    alert-{{ category }}
+    """
+    words, prefixes = set(SAFELIST), set(SAFE_PREFIXES)
+    for path in templates.rglob('*.html'):
+        text = path.read_text()
+        words.update(_WORD_RE.findall(text))
+        prefixes.update(_PREFIX_RE.findall(text))
+    return words, tuple(prefixes)
+
+
+def _skip_string(css, i):
+    quote = css[i]
+    i += 1
+    while i < len(css) and css[i] != quote:
+        i += 2 if css[i] == '\\' else 1
+    return i + 1
+
+
+def split_rules(css):
+    """Top-level (prelude, body) pairs of a stylesheet, comments dropped"""
+    rules = []
+    i, start, depth, body_start = 0, 0, 0, 0
+    while i < len(css):
+        char = css[i]
+        if css.startswith('/*', i):
+            end = css.find('*/', i + 2)
+            i = len(css) if end < 0 else end + 2
+            if depth == 0:
+                start = i
+            continue
+        if char in '"\'':
+            i = _skip_string(css, i)
+            continue
+        if char == '{':
+            if depth == 0:
+                prelude, body_start = css[start:i].strip(), i + 1
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                rules.append((prelude, css[body_start:i]))
+                start = i + 1
+        elif char == ';' and depth == 0:
+            # @charset/@import statements
+            rules.append((css[start:i + 1].strip(), None))
+            start = i + 1
+        i += 1
+    return rules
+
+
+def split_selectors(prelude):
+    selectors, depth, start = [], 0, 0
+    for i, char in enumerate(prelude):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(prelude[start:i])
+            start = i + 1
+    selectors.append(prelude[start:])
+    return [s.strip() for s in selectors if s.strip()]
+
+
+def _selector_used(selector, words, prefixes):
+    for name in _CLASS_RE.findall(_NOT_RE.sub('', selector)):
+        if name not in words and not name.startswith(prefixes):
+            return False
+    return True
+
+
+def trim_css(css, words, prefixes):
+    """Drop the rules whose selectors all name classes the templates never use"""
+    out = []
+    for prelude, body in split_rules(css):
+        if body is None:
+            out.append(prelude)
+        elif prelude.startswith(('@media', '@supports', '@container', '@layer')):
+            inner = trim_css(body, words, prefixes)
+            if inner:
+                out.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith('@'):
+            # @font-face, @keyframes and friends are kept whole
+            out.append(f'{prelude}{{{body}}}')
+        else:
+            selectors = [s for s in split_selectors(prelude) if _selector_used(s, words, prefixes)]
+            if selectors:
+                out.append(f"{','.join(selectors)}{{{body}}}")
+    return ''.join(out)
+
+
+# ======================
+# Build
+# ======================
+
+
+def fetch(url, from_dir):
+    if from_dir is not None:
+        return (from_dir / url.rsplit('/', 1)[-1]).read_bytes()
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read()
+
+
+def compress(path):
+    data = path.read_bytes()
+    with open(f'{path}.gz', 'wb') as f:
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+    try:
+        import brotli
+    except ImportError:
+        return
+    Path(f'{path}.br').write_bytes(brotli.compress(data, quality=11))
+
+
+def missing():
+    """Assets not in static/vendor yet"""
+    return [target for target in ASSETS if not (STATIC / target).is_file()]
+
+
+def build(into, from_dir, trim=True):
+    words, prefixes = used_classes()
+    for target, url in ASSETS.items():
+        path = into / target
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            data = fetch(url, from_dir)
+        except OSError as e:
+            raise OSError(f'{target}: {e}') from None
+        if target in TRIMMED and trim:
+            before = len(data)
+            data = trim_css(data.decode(), words, prefixes).encode()
+            print(f'{target}: trimmed {before} -> {len(data)} bytes')
+        path.write_bytes(data)
+        if path.suffix in COMPRESSIBLE:
+            compress(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--from-dir', type=Path,
+                        help='take the files from this directory (by file name) instead of the CDNs')
+    parser.add_argument('--no-trim', action='store_true', help='keep the full Bootstrap stylesheet')
+    parser.add_argument('--check', action='store_true',
+                        help="only check that every asset is vendored, exit 1 if one isn't")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        for target in missing():
+            print(f'missing: {target}')
+        return 1 if missing() else 0
+
+    # Built next to the old copy and swapped in only once every file is
+    # there, so a failed download leaves static/vendor as it was
+    STATIC.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix='.vendor-', dir=STATIC.parent))
+    try:
+        build(staging, args.from_dir, trim=not args.no_trim)
+    except BaseException as e:
+        shutil.rmtree(staging)
+        if not isinstance(e, OSError):
+            raise
+        print(f'error: {e}; {os.path.relpath(STATIC)} left as it was', file=sys.stderr)
+        return 1
+    staging.chmod(0o755)
+    if STATIC.exists():
+        old = STATIC.with_name(f'{staging.name}-old')
+        STATIC.rename(old)
+        staging.rename(STATIC)
+        shutil.rmtree(old)
+    else:
+        staging.rename(STATIC)
+    print(f'Wrote {len(ASSETS)} assets to {os.path.relpath(STATIC)}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
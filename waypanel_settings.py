@@ -1,268 +1,848 @@
 import asyncio
+import codecs
+import hashlib
+import json
 import logging
+import mimetypes
 import os
+import re
 import signal
-import subprocess
+import socket
 import sys
 import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from pathlib import Path
 
-import toml
-import webview
 from hypercorn.asyncio import serve
 from hypercorn.config import Config
-from quart import Quart, flash, redirect, render_template, request, url_for
-from werkzeug.utils import secure_filename
+from markupsafe import Markup
+from quart import (Quart, Response, abort, flash, g, make_response, redirect, render_template,
+                   request, send_file, session, url_for)
+from werkzeug.utils import safe_join, secure_filename
 
-app = Quart(__name__)
+from . import history, toml_codec
+from .core import (CONFIG_PATH, TRANSFER_FORMATS, TRANSFER_SECTIONS, BatchError, ConfigView, DockbarApp,
+                   DockOrder, EntryReader, FolderEntry, MenuItem, TransferError, _config_cache,
+                   apply_batch, clean_config, config_entries, content_digest, diff_configs,
+                   dump_entries, get_key, import_entries, listing, panel_schema, read_config,
+                   same_config, section_hashes, submenu_items, update_panel, watch_opens, write_config)
+
+__all__ = ['app', 'main', 'load_config', 'save_config']
+
+app = Quart(__name__, static_folder=None)
 app.secret_key = 'your-secret-key-here'
-app.config['CONFIG_PATH'] = os.path.expanduser('~/.config/waypanel/waypanel.toml')
+app.config['CONFIG_PATH'] = CONFIG_PATH
+# Saves submitted within this many seconds are written together
+app.config['SAVE_DELAY'] = 0.25
+# Run config file I/O in a thread pool instead of on the event loop
+app.config['OFFLOAD_IO'] = True
+# Rows per page of the dockbar, menu and folders listings (?limit= is capped at MAX_PAGE_SIZE)
+app.config['PAGE_SIZE'] = 100
+app.config['MAX_PAGE_SIZE'] = 1000
+# File changes within this many seconds are pushed to open pages as one event
+app.config['EVENTS_DELAY'] = 0.05
+# How waypanel is (re)started, and how long to wait for it to stop and to settle
+app.config['WAYPANEL_COMMAND'] = ['waypanel']
+app.config['RELOAD_DEBOUNCE'] = 0.3
+app.config['RELOAD_STOP_TIMEOUT'] = 2.0
+app.config['RELOAD_SETTLE'] = 0.3
+app.config['RELOAD_READY_TIMEOUT'] = 15.0
+# 'restart', or 'signal' / 'socket' to ask waypanel to reload itself, restarting
+# it if it doesn't acknowledge within RELOAD_ACK_TIMEOUT
+app.config['RELOAD_MODE'] = 'restart'
+app.config['RELOAD_SIGNAL'] = 'SIGHUP'
+app.config['RELOAD_SOCKET'] = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'waypanel.sock')
+app.config['RELOAD_ACK_TIMEOUT'] = 2.0
+# Tables waypanel reloads by itself when the file changes; saves touching only these don't reload it
+app.config['HOT_RELOAD_SECTIONS'] = ()
+# Reload waypanel after saves, batching saves within AUTO_RELOAD_DELAY seconds
+app.config['AUTO_RELOAD'] = False
+app.config['AUTO_RELOAD_DELAY'] = 2.0
+# /api/export streams its output in chunks of about this many bytes
+app.config['EXPORT_CHUNK_SIZE'] = 64 * 1024
+
+# Template filters for type checking
+
+
+@app.template_filter('is_boolean')
+def is_boolean(value):
+    return isinstance(value, bool)
 
-__all__ = ['Config', 'load_config', 'save_config']
 
+@app.template_filter('is_number')
+def is_number(value):
+    return isinstance(value, (int, float))
+
+
+@app.template_filter('is_integer')
+def is_integer(value):
+    return isinstance(value, int)
 
-def clean_orphaned_sections(config):
+
+@app.template_filter('toml')
+def toml_literal(value):
+    """A value as it would be written to waypanel.toml"""
+    return toml_codec.format_value(value)
+
+
+@app.template_filter('timestamp')
+def timestamp(value):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(value))
+
+
+@app.context_processor
+def reload_state():
+    # Pages pass the waypanel config as `config`, hiding the app's own
+    return {'auto_reload': app.config['AUTO_RELOAD']}
+
+
+# ======================
+# Static Assets
+# ======================
+
+# Vendored by tools/build_assets.py
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+_asset_versions = {}
+
+
+@app.template_global()
+def asset_url(filename, fallback=None):
     """
-    Specifically removes empty sections that:
-    1. Are in the format [prefix.suffix]
-    2. Have no contents
-    3. Aren't standard configuration sections
+    URL of a vendored asset, versioned by a hash of its content so it can be
+    cached forever. Falls back to the given URL (the CDN) if the asset
+    hasn't been vendored yet; that is checked again on every render, so
+    assets vendored while the app runs are picked up.
     """
-    # List of protected section names that should never be removed
-    PROTECTED_SECTIONS = {
-        'panel', 'menu', 'folders', 'dockbar',
-        'cmd', 'launcher', 'dpms'  # Add all your real sections here
-    }
-
-    # Create a list of all section names in the config
-    all_sections = list(config.keys())
+    version = _asset_versions.get(filename)
+    if version is None:
+        try:
+            with open(safe_join(STATIC_DIR, filename), 'rb') as f:
+                version = hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+        except (OSError, TypeError):
+            return fallback or url_for('static', filename=filename)
+        _asset_versions[filename] = version
+    return url_for('static', filename=filename, v=version)
 
-    for section_name in all_sections:
-        # Check if this is a dotted section (like test.something)
-        if '.' in section_name:
-            prefix = section_name.split('.')[0]
 
-            # Only remove if:
-            # 1. The prefix isn't a protected section
-            # 2. The section is completely empty
-            if (prefix not in PROTECTED_SECTIONS and
-                    not config[section_name]):
-                del config[section_name]
-                print(f"Removed empty orphaned section: [{section_name}]")
+@app.route('/static/<path:filename>')
+async def static(filename):
+    """
+    Vendored assets with immutable caching. A precompressed .br or .gz
+    sibling is sent instead when the client accepts that encoding.
+    """
+    path = safe_join(STATIC_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+            response = await send_file(path + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = await send_file(path, mimetype=mimetype)
 
-    return config
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 
 def load_config():
+    if _config_writer.pending is not None:
+        # Serve edits that are still waiting to be written
+        return ConfigView(_config_writer.pending, dirty=set())
+    return read_config(app.config['CONFIG_PATH'])
+
+
+# Config file I/O runs here so a slow disk or a big parse never stalls the
+# event loop. Two workers: writes are serialized by ConfigWriter anyway.
+_io_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='config-io')
+
+
+async def run_io(func, *args):
+    """Run blocking file I/O off the event loop (inline if OFFLOAD_IO is off)"""
+    if not app.config['OFFLOAD_IO']:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(_io_executor, func, *args)
+
+
+async def aload_config():
+    if _config_writer.pending is None:
+        config = _config_cache.peek(app.config['CONFIG_PATH'])
+        if config is not None:
+            return ConfigView(config, dirty=set(), base=config)
+    return await run_io(load_config)
+
+
+async def asave_config(config):
+    return await run_io(save_config, config)
+
+
+def save_config(config):
+    return write_config(app.config['CONFIG_PATH'], config)
+
+
+class ConfigWriter:
+    """
+    Single writer for the config file.
+
+    Routes hand it mutation functions instead of calling save_config()
+    themselves. Mutations run one at a time under an asyncio lock against a
+    shared pending config, and everything submitted within SAVE_DELAY seconds
+    of the first mutation is written out together in one fsync'd save.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.lock = None
+        self.pending = None
+        self.flush_task = None
+        self.logger = logging.getLogger('ConfigWriter')
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop, self.lock, self.flush_task = loop, asyncio.Lock(), None
+
+    async def submit(self, mutate, offload=False):
+        """
+        Apply mutate(config) to the pending config and return its result.
+        offload runs a bulk mutation through run_io, so the event loop keeps
+        serving reads (of the previous pending config) meanwhile. mutate may
+        be a coroutine function, for a mutation that waits on its input (a
+        request body); other saves wait until it finishes.
+        """
+        self._bind()
+        async with self.lock:
+            base = self.pending if self.pending is not None else await aload_config()
+            # Mutate a layer on top so a failing mutation leaves no trace
+            layer = ConfigView(base, dirty=set(getattr(base, '_dirty', ())),
+                               base=getattr(base, '_base', None))
+            result = await run_io(mutate, layer) if offload else mutate(layer)
+            if asyncio.iscoroutine(result):
+                result = await result
+            self.pending = layer
+            if self.flush_task is None:
+                self.flush_task = self.loop.create_task(self._flush_later())
+            return result
+
+    async def _flush_later(self):
+        await asyncio.sleep(app.config['SAVE_DELAY'])
+        try:
+            await self.flush()
+        except Exception:
+            # Logged by flush(); the edits stay pending for the next save
+            pass
+
+    async def flush(self):
+        """
+        Write the pending config now. A failed save raises and keeps the
+        edits pending, so readers still see them and the next flush retries.
+        """
+        if self.lock is None:
+            return
+        async with self.lock:
+            config, self.flush_task = self.pending, None
+            if config is None or not config._dirty:
+                self.pending = None
+                return
+            sections = changed_sections(config) if app.config['AUTO_RELOAD'] else None
+            try:
+                saved = await asave_config(config)
+            except Exception as e:
+                self.logger.error(f"Failed to save config: {e}")
+                raise
+            # Readers keep seeing the pending config until it is on disk
+            self.pending = None
+            if not saved:
+                self.logger.debug("Edits left the config as it was, nothing written")
+            elif app.config['AUTO_RELOAD']:
+                # Saves within AUTO_RELOAD_DELAY share one reload
+                _reload_supervisor.request(app.config['AUTO_RELOAD_DELAY'], sections)
+
+
+def changed_sections(config):
+    """Top-level tables a pending config changes, None if it isn't a view of the file"""
+    base = getattr(config, '_base', None)
+    if base is None:
+        return None
+    diff = diff_configs(base, config)
+    return {change['path'][0] for changes in diff.values() for change in changes}
+
+
+_config_writer = ConfigWriter()
+
+
+async def update_config(mutate, offload=False):
+    """Queue a config change; mutate(config) edits the config in place"""
+    return await _config_writer.submit(mutate, offload)
+
+
+async def save_now():
+    """Write queued edits now; returns why that failed, None once they are on disk"""
     try:
-        with open(app.config['CONFIG_PATH'], 'r') as f:
-            config = toml.load(f)
-            return clean_orphaned_sections(config)
-    except FileNotFoundError:
-        return {
-            'panel': {},
-            'menu': {'icons': {}},
-            'folders': {},
-            'dockbar': {},
-            'cmd': {},
-            'launcher': {}
-        }
-
-
-@app.route('/reload_waypanel', methods=['POST'])
-async def reload_waypanel():
-    try:
-        # Kill and restart waypanel
-        subprocess.Popen('pkill waypanel; waypanel', shell=True)
-        return {'success': True, 'message': 'Waypanel reload initiated'}
+        await _config_writer.flush()
     except Exception as e:
-        return {'success': False, 'message': str(e)}
+        return f'Failed to save config: {e}'
+    return None
 
 
-def save_config(config):
-    """Save config with proper TOML formatting"""
-    # First clean empty sections
-    if 'menu' in config:
-        config['menu'] = {k: v for k, v in config['menu'].items() if v}
+@app.after_serving
+async def flush_config():
+    try:
+        await _config_writer.flush()
+    except Exception:
+        pass
 
-    # Write to temporary file first for atomic save
-    temp_path = f"{app.config['CONFIG_PATH']}.tmp"
-    with open(temp_path, 'w') as f:
-        toml.dump(config, f)
 
-    # Replace original file
-    os.replace(temp_path, app.config['CONFIG_PATH'])
+def wants_json():
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
 
 
-def get_menu_items(submenu_data):
-    """Extract menu items from submenu data in any format"""
-    items = []
+async def respond(location, message=None, category='success', **data):
+    """
+    Finish a mutation. fetch() callers asking for JSON get the message and
+    any extra data in one response to update the page in place; plain form
+    posts get the message flashed and a redirect to location.
+    """
+    if wants_json():
+        return {'success': category != 'error', 'message': message, 'category': category, **data}
+    if message:
+        await flash(message, category)
+    return redirect(location)
 
-    if isinstance(submenu_data, list):
-        # Handle array-of-tables format: [[menu.VPN.item1], [menu.VPN.item2]]
-        items = submenu_data
-    elif isinstance(submenu_data, dict):
-        # Handle dictionary format: [menu.VPN.item1], [menu.VPN.item2]
-        items = [value for key, value in submenu_data.items()
-                 if key.startswith('item') and isinstance(value, dict)]
 
-    # Add position information for sorting
-    for idx, item in enumerate(items):
-        if '_key' not in item:
-            item['_key'] = f'item_{idx + 1}'
+# ======================
+# Waypanel Reload
+# ======================
 
-    # Sort items by their key (item1, item2, etc.)
-    items.sort(key=lambda x: int(x['_key'].split('_')[-1]))
 
-    return items
+# Programs whose first non-option argument is the program they run
+INTERPRETER_RE = re.compile(r'(python|pypy)[\d.]*|(ba|da|z)?sh')
 
 
-app = Quart(__name__)
-app.secret_key = 'your-secret-key-here'
-app.config['CONFIG_PATH'] = os.path.expanduser('~/.config/waypanel/waypanel.toml')
+def running_program(argv):
+    """Name of the program argv runs: its command, or the script or module an interpreter runs"""
+    if not argv or not argv[0]:
+        return None
+    command = os.path.basename(argv[0])
+    if not INTERPRETER_RE.fullmatch(command):
+        return command
+    # python3 -u /usr/bin/waypanel, python3 -m waypanel
+    script = next((arg for arg in argv[1:] if not arg.startswith('-')), None)
+    return os.path.basename(script) if script else command
 
-# Template filters for type checking
 
+def find_processes(name):
+    """
+    PIDs of processes running the program name: its command name, or the
+    script an interpreter runs (``python3 /usr/bin/waypanel``), is name.
+    A file named like it elsewhere on a command line (``vim waypanel``)
+    doesn't count.
+    """
+    pids = []
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit() or int(entry.name) == os.getpid():
+            continue
+        try:
+            with open(f'/proc/{entry.name}/comm') as f:
+                found = f.read().rstrip('\n') == name
+            if not found:
+                with open(f'/proc/{entry.name}/cmdline', 'rb') as f:
+                    argv = [arg.decode(errors='replace') for arg in f.read().split(b'\0')[:-1]]
+                found = running_program(argv) == name
+        except OSError:
+            # Exited while we were looking
+            continue
+        if found:
+            pids.append(int(entry.name))
+    return pids
+
+
+def process_state(pid):
+    """One-letter scheduler state from /proc/<pid>/stat, None once it's gone"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rpartition(')')[2].split()[0]
+    except (OSError, IndexError):
+        return None
 
-@app.template_filter('is_boolean')
-def is_boolean(value):
-    return isinstance(value, bool)
 
+def holds_open(pid, path):
+    """True if process pid has path open right now"""
+    try:
+        for entry in os.scandir(f'/proc/{pid}/fd'):
+            try:
+                if os.readlink(entry.path) == path:
+                    return True
+            except OSError:
+                # Closed while we were looking
+                continue
+    except OSError:
+        pass
+    return False
 
-@app.template_filter('is_number')
-def is_number(value):
-    return isinstance(value, (int, float))
 
+class ReloadSupervisor:
+    """
+    Reloads waypanel on request, one reload at a time.
+
+    Requests within RELOAD_DEBOUNCE seconds of the first share one reload
+    and its result; requests made while a reload runs get the next one,
+    since the running waypanel may have read the config before their
+    change. Requests that only concern HOT_RELOAD_SECTIONS, which waypanel
+    picks up by itself, don't reload at all.
+
+    RELOAD_MODE 'signal' sends waypanel RELOAD_SIGNAL and 'socket' writes
+    a reload request to RELOAD_SOCKET; both fall back to a restart if
+    waypanel doesn't acknowledge within RELOAD_ACK_TIMEOUT. For a restart
+    waypanel is started with create_subprocess_exec in its own session,
+    without a shell, and awaited in the background so it is reaped
+    whenever it exits. It counts as ready once it has stayed idle in its
+    event loop for RELOAD_SETTLE seconds.
+    """
 
-@app.template_filter('is_integer')
-def is_integer(value):
-    return isinstance(value, int)
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self.loop = None
+        self.lock = None
+        self.pending = None
+        # Config tables the pending reload is for, None for everything
+        self.sections = None
+        self.process = None
+        self.last = None
+        self.logger = logging.getLogger('ReloadSupervisor')
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop, self.lock, self.pending = loop, asyncio.Lock(), None
+
+    def request(self, delay=None, sections=None):
+        """
+        Ask for a reload because of changes to sections (None: reload
+        regardless); returns a future for the result of the reload that
+        covers it
+        """
+        self._bind()
+        if self.pending is None:
+            self.pending = self.loop.create_future()
+            self.sections = set(sections) if sections is not None else None
+            self.loop.create_task(self._run(self.pending, app.config['RELOAD_DEBOUNCE'] if delay is None else delay))
+        elif self.sections is not None:
+            self.sections = self.sections | set(sections) if sections is not None else None
+        return self.pending
+
+    async def _run(self, future, delay):
+        await asyncio.sleep(delay)
+        async with self.lock:
+            sections = self.sections
+            if self.pending is future:
+                self.pending = None
+            try:
+                if sections is not None and sections <= set(app.config['HOT_RELOAD_SECTIONS']):
+                    result = {'success': True, 'skipped': True,
+                              'message': 'Waypanel picks these changes up by itself'}
+                else:
+                    result = await self.reload()
+            except Exception as e:
+                self.logger.error(f"Reload failed: {e}")
+                result = {'success': False, 'message': f'Reload failed: {e}'}
+            self.last = {**result, 'time': time.time()}
+            future.set_result(result)
+
+    async def reload(self):
+        mode = app.config['RELOAD_MODE']
+        if mode == 'restart':
+            return await self.restart()
+        started = time.perf_counter()
+        if mode == 'signal':
+            acknowledged = await self.send_signal()
+        elif mode == 'socket':
+            acknowledged = await self.send_request()
+        else:
+            raise ValueError(f'Unknown RELOAD_MODE {mode!r}')
+        if acknowledged:
+            elapsed = time.perf_counter() - started
+            return {'success': True, 'mode': mode, 'ack_time': round(elapsed, 3),
+                    'message': f'Waypanel reloaded its config in {elapsed:.2f}s'}
+        self.logger.info(f"waypanel didn't acknowledge the {mode} reload, restarting it")
+        result = await self.restart()
+        return {**result, 'mode': 'restart', 'fallback': True}
+
+    async def send_signal(self):
+        """
+        Send RELOAD_SIGNAL to waypanel. It is acknowledged when waypanel,
+        still running, opens the config file again within the timeout.
+
+        inotify doesn't say who opened the file, and this app, editors and
+        the history open it too, so an open only counts if one of the
+        signalled processes has the file open when it is reported. One
+        that reads it faster than that gets restarted: a needless restart
+        beats reporting a reload that never happened.
+        """
+        name = os.path.basename(app.config['WAYPANEL_COMMAND'][0])
+        pids = await run_io(find_processes, name)
+        if not pids:
+            return False
+        path = os.path.realpath(app.config['CONFIG_PATH'])
+        fd = watch_opens(path)
+        opened = self.loop.create_future()
+
+        def on_open():
+            try:
+                os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            if not opened.done() and any(holds_open(pid, path) for pid in pids):
+                opened.set_result(True)
+
+        self.loop.add_reader(fd, on_open)
+        try:
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.Signals[app.config['RELOAD_SIGNAL']])
+                except ProcessLookupError:
+                    pass
+            try:
+                await asyncio.wait_for(opened, app.config['RELOAD_ACK_TIMEOUT'])
+            except asyncio.TimeoutError:
+                return False
+        finally:
+            self.loop.remove_reader(fd)
+            os.close(fd)
+        # A waypanel without a handler for the signal may have died of it
+        await asyncio.sleep(self.POLL_INTERVAL)
+        return any(process_state(pid) not in (None, 'Z') for pid in pids)
+
+    async def send_request(self):
+        """Write "reload" to RELOAD_SOCKET; acknowledged by an "ok" line back"""
+        timeout = app.config['RELOAD_ACK_TIMEOUT']
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_unix_connection(app.config['RELOAD_SOCKET']), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        try:
+            writer.write(b'reload\n')
+            await writer.drain()
+            reply = await asyncio.wait_for(reader.readline(), timeout)
+            return reply.strip().lower() == b'ok'
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            writer.close()
+
+    async def restart(self):
+        command = app.config['WAYPANEL_COMMAND']
+        name = os.path.basename(command[0])
+        started = time.perf_counter()
+
+        await self.stop(name)
+        stopped = time.perf_counter()
+
+        self.process = await asyncio.create_subprocess_exec(
+            *command, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL, start_new_session=True)
+        self.loop.create_task(self._reap(self.process))
+
+        ready = await self.wait_ready(self.process)
+        elapsed = time.perf_counter() - started
+        result = {'pid': self.process.pid, 'stop_time': round(stopped - started, 3),
+                  'ready_time': round(time.perf_counter() - stopped, 3)}
+        if ready is None:
+            return {'success': False, 'message': f'waypanel exited with status {self.process.returncode}',
+                    **result}
+        if not ready:
+            return {'success': False, 'message': f'waypanel did not settle within {elapsed:.1f}s',
+                    **result}
+        self.logger.info(f"waypanel ready in {elapsed:.2f}s (pid {self.process.pid})")
+        return {'success': True, 'message': f'Waypanel reloaded in {elapsed:.1f}s', **result}
+
+    async def stop(self, name):
+        """SIGTERM every running waypanel, SIGKILL what is left after RELOAD_STOP_TIMEOUT"""
+        pids = await run_io(find_processes, name)
+        if self.process is not None and self.process.returncode is None and self.process.pid not in pids:
+            pids.append(self.process.pid)
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            for pid in pids:
+                try:
+                    os.kill(pid, sig)
+                except ProcessLookupError:
+                    pass
+            deadline = time.monotonic() + app.config['RELOAD_STOP_TIMEOUT']
+            while pids and time.monotonic() < deadline:
+                await asyncio.sleep(self.POLL_INTERVAL)
+                pids = [pid for pid in pids if process_state(pid) not in (None, 'Z')]
+            if not pids:
+                break
+            self.logger.warning(f"waypanel did not exit on SIGTERM, killing {pids}")
+        if self.process is not None:
+            try:
+                # Reaped by _reap in any case; this only keeps its exit ahead of the next start
+                await asyncio.wait_for(asyncio.shield(self.process.wait()), app.config['RELOAD_STOP_TIMEOUT'])
+            except asyncio.TimeoutError:
+                self.logger.warning(f"waypanel (pid {self.process.pid}) survived SIGKILL, starting anew")
+
+    async def wait_ready(self, process):
+        """True once process idles for RELOAD_SETTLE seconds, False on timeout, None if it exited"""
+        settle = max(1, round(app.config['RELOAD_SETTLE'] / self.POLL_INTERVAL))
+        deadline = time.monotonic() + app.config['RELOAD_READY_TIMEOUT']
+        idle = 0
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            state = process_state(process.pid)
+            if process.returncode is not None or state in (None, 'Z'):
+                return None
+            idle = idle + 1 if state == 'S' else 0
+            if idle >= settle:
+                return True
+        return False
+
+    async def _reap(self, process):
+        code = await process.wait()
+        if process is self.process:
+            self.logger.info(f"waypanel (pid {process.pid}) exited with status {code}")
+
+
+_reload_supervisor = ReloadSupervisor()
+
+
+@app.route('/reload_waypanel', methods=['GET', 'POST'])
+async def reload_waypanel():
+    """POST reloads waypanel and answers once it is back; GET reports the last reload"""
+    if request.method == 'GET':
+        return {'last': _reload_supervisor.last, 'auto': app.config['AUTO_RELOAD'],
+                'mode': app.config['RELOAD_MODE']}
+    return await _reload_supervisor.request()
 
 
-def clean_orphaned_sections(config):
-    PROTECTED_SECTIONS = {
-        'panel', 'menu', 'folders', 'dockbar',
-        'cmd', 'launcher', 'dpms'
-    }
+@app.route('/reload_waypanel/auto', methods=['POST'])
+async def auto_reload():
+    """Turn restarting waypanel after every save on or off"""
+    data = await request.get_json(silent=True)
+    if data is None:
+        data = (await request.form).to_dict()
+    enabled = data.get('enabled')
+    app.config['AUTO_RELOAD'] = enabled is True or str(enabled).lower() in ('true', '1', 'on')
+    return {'success': True, 'auto': app.config['AUTO_RELOAD']}
 
-    all_sections = list(config.keys())
-    for section_name in all_sections:
-        if '.' in section_name:
-            prefix = section_name.split('.')[0]
-            if (prefix not in PROTECTED_SECTIONS and not config[section_name]):
-                del config[section_name]
-    return config
 
+# ======================
+# Conditional Responses
+# ======================
 
-def load_config():
-    try:
-        with open(app.config['CONFIG_PATH'], 'r') as f:
-            config = toml.load(f)
-            return clean_orphaned_sections(config)
-    except FileNotFoundError:
-        return {
-            'panel': {},
-            'menu': {'icons': {}},
-            'folders': {},
-            'dockbar': {},
-            'cmd': {},
-            'launcher': {}
-        }
+_template_version = None
 
 
-def save_config(config):
-    if 'menu' in config:
-        config['menu'] = {k: v for k, v in config['menu'].items() if v}
+def template_version():
+    """Digest of the templates, so a template change also changes every ETag"""
+    global _template_version
+    if _template_version is None:
+        digest = hashlib.blake2b(digest_size=6)
+        for path in sorted(Path(app.root_path, app.template_folder).rglob('*.html')):
+            digest.update(path.read_bytes())
+        _template_version = digest.hexdigest()
+    return _template_version
+
+
+def conditional(*sections):
+    """
+    ETag GET responses on the template version and the content of the
+    config sections the page shows (the whole config and its mtime when
+    none are given). A matching If-None-Match gets a 304 without rendering.
+    Pages with pending edits or flash messages are always rendered.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            # Tells the live update script which changes concern this page
+            g.live_sections = list(sections)
+            if request.method != 'GET' or '_flashes' in session:
+                return await view(*args, **kwargs)
+            config = await aload_config()
+            # Hashed once per loaded config, but that first time walks every table
+            digest = await run_io(content_digest, config, sections or list(config))
+            if digest is None:
+                return await view(*args, **kwargs)
+            # base.html renders the auto-reload switch
+            auto = int(app.config['AUTO_RELOAD'])
+            etag = f'{template_version()}-{auto}-{digest}'
+            if not sections:
+                mtime = await run_io(_last_modified, app.config['CONFIG_PATH'])
+                etag += '-' + hashlib.blake2b(mtime.encode(), digest_size=4).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = Response('', status=304)
+            else:
+                response = await make_response(await view(*args, **kwargs))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+class FragmentCache:
+    """
+    Rendered HTML fragments, each valid while the config table it was
+    rendered from is still the same object. Saves share untouched tables
+    with the previous config, so an edit only invalidates the fragments of
+    the tables it replaced; re-parsing the file invalidates them all.
+    """
 
-    temp_path = f"{app.config['CONFIG_PATH']}.tmp"
-    with open(temp_path, 'w') as f:
-        toml.dump(config, f)
-    os.replace(temp_path, app.config['CONFIG_PATH'])
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key, source):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] is not source:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, source, html):
+        self.entries[key] = (source, html)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+_fragments = FragmentCache(maxsize=20000)
+
+
+async def render_rows(rows_template, entries, rows, **context):
+    """Render listing rows one by one, reusing the cached HTML of unchanged rows"""
+    template = app.jinja_env.get_template(rows_template)
+    # Rows only care whether a search is active and whether they are the last row
+    signature = tuple(sorted((k, v) for k, v in context.items() if k not in ('query', 'size')))
+    last = context.get('size', 0) - 1
+    parts = []
+    for row in rows:
+        source = entries.sources[row[0]]
+        key = (rows_template, row[0], row[1], row[0] == last, bool(context.get('query')), signature)
+        html = _fragments.get(key, source) if source is not None else None
+        if html is None:
+            html = await template.render_async(rows=[row], **context)
+            if source is not None:
+                _fragments.put(key, source, html)
+        parts.append(html)
+    return Markup(''.join(parts))
 
 
-def get_menu_items(submenu_data):
-    items = []
-    if isinstance(submenu_data, list):
-        items = submenu_data
-    elif isinstance(submenu_data, dict):
-        items = [value for key, value in submenu_data.items()
-                 if key.startswith('item') and isinstance(value, dict)]
+# ======================
+# Listings
+# ======================
 
-    for idx, item in enumerate(items):
-        if '_key' not in item:
-            item['_key'] = f'item_{idx + 1}'
-    items.sort(key=lambda x: int(x['_key'].split('_')[-1]))
-    return items
 
+def page_args():
+    """(query, offset, limit) from ?q=&offset=&limit="""
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = request.args.get('limit', app.config['PAGE_SIZE'], type=int)
+    return request.args.get('q', ''), offset, min(max(1, limit), app.config['MAX_PAGE_SIZE'])
+
+
+async def render_listing(template, rows_template, config, name, **context):
+    """
+    Render one page of a listing. With ?fragment=1 only the rows are
+    rendered, which is what the listing script fetches as you scroll.
+    """
+    entries = listing(config, name)
+    query, offset, limit = page_args()
+    total, rows = entries.page(query, offset, limit)
+    rows_html = await render_rows(rows_template, entries, rows, size=len(entries), query=query, **context)
+    if request.args.get('fragment'):
+        return rows_html, {'X-Total-Count': str(total)}
+    context.update(rows=rows, rows_html=rows_html, total=total, size=len(entries),
+                   query=query, offset=offset, limit=limit)
+    return await render_template(template, **context)
+
+
+@app.route('/api/<any(dockbar, folders, menu):section>')
+@app.route('/api/menu/<submenu_name>')
+async def api_listing(section='menu', submenu_name=None):
+    """JSON page of a listing, with the same ?q=&offset=&limit= as the HTML views"""
+    config = await aload_config()
+    entries = listing(config, ('menu', submenu_name) if submenu_name is not None else section)
+    query, offset, limit = page_args()
+    total, rows = entries.page(query, offset, limit)
+    return {
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'rows': [{'id': row_id, 'position': position, **table} for position, row_id, table in rows]
+    }
 
-@app.route('/reload_waypanel', methods=['POST'])
-async def reload_waypanel():
-    try:
-        subprocess.Popen('pkill waypanel; waypanel', shell=True)
-        return {'success': True, 'message': 'Waypanel reload initiated'}
-    except Exception as e:
-        return {'success': False, 'message': str(e)}
 
 # ======================
 # Panel Settings Routes
 # ======================
 
 
+def panel_fields(config, submitted=None):
+    """
+    The panel form's fields grouped by table: {table: [(key, label, type,
+    text)]}, with dotted keys relative to [panel] and any submitted text
+    taking the place of the stored value.
+    """
+    schema = panel_schema(config)
+    groups = {}
+    for key, kind in schema.types.items():
+        table, _, label = key.rpartition('.')
+        if submitted is not None and key in submitted:
+            text = submitted[key]
+        else:
+            text = schema.form_value(get_key(config['panel'], key))
+        groups.setdefault(table, []).append((key, label, kind, text))
+    return groups
+
+
 @app.route('/panel', methods=['GET', 'POST'])
+@conditional('panel')
 async def panel_settings():
-    config = load_config()
-    panel_config = config.get('panel', {})
+    config = await aload_config()
 
     if request.method == 'POST':
-        # Rebuild the entire panel config from form data
-        new_config = {}
         form = await request.form
+        fields = {k: v for k, v in form.items() if k not in ('csrf_token', 'action')}
+
+        if form.get('action') == 'review':
+            proposed = ConfigView(config, dirty=set())
+            try:
+                update_panel(proposed, fields)
+            except ValueError as e:
+                await flash(str(e), 'error')
+                return await render_template('panel/panel_edit.html',
+                                             panel_fields=panel_fields(config, fields))
+            return await render_template('panel/review.html',
+                                         diff=diff_configs(config, proposed),
+                                         fields=list(fields.items()))
 
-        for key, value in form.items():
-            if key == 'csrf_token':
-                continue
-
-            # Handle nested keys (like "bottom.enabled")
-            parts = key.split('.')
-            current = new_config
-            for part in parts[:-1]:
-                if part not in current:
-                    current[part] = {}
-                current = current[part]
-            current[parts[-1]] = value
-
-        # Preserve the original structure
-        config['panel'] = new_config
-        save_config(config)
-        await flash('Panel settings saved!', 'success')
+        try:
+            changed = await update_config(lambda config: update_panel(config, fields))
+        except ValueError as e:
+            await flash(str(e), 'error')
+            return await render_template('panel/panel_edit.html',
+                                         panel_fields=panel_fields(config, fields))
+        if changed:
+            await flash(f'Panel settings saved ({len(changed)} changed)', 'success')
+        else:
+            await flash('No changes to save', 'info')
         return redirect(url_for('panel_settings'))
 
-    return await render_template('panel/panel_edit.html',
-                                 panel_config=panel_config,
-                                 panel_sections=sorted(panel_config.keys()))
-
-
-def convert_value_type(value):
-    if isinstance(value, str):
-        if value.lower() == 'true':
-            return True
-        elif value.lower() == 'false':
-            return False
-        elif value.isdigit():
-            return int(value)
-        try:
-            return float(value)
-        except ValueError:
-            return value
-    return value
+    return await render_template('panel/panel_edit.html', panel_fields=panel_fields(config))
 
 
 @app.route('/panel/add_setting', methods=['GET', 'POST'])
 async def add_panel_setting():
     if request.method == 'POST':
         form = await request.form
-        config = load_config()
 
         setting_name = form['name'].strip()
         setting_value = form['value'].strip()
@@ -275,8 +855,10 @@ async def add_panel_setting():
         elif setting_type == 'float':
             setting_value = float(setting_value)
 
-        config.setdefault('panel', {})[setting_name] = setting_value
-        save_config(config)
+        def add_setting(config):
+            config.setdefault('panel', {})[setting_name] = setting_value
+
+        await update_config(add_setting)
         await flash('Setting added!', 'success')
         return redirect(url_for('panel_settings'))
 
@@ -285,12 +867,15 @@ async def add_panel_setting():
 
 @app.route('/panel/delete_setting/<setting_name>', methods=['POST'])
 async def delete_panel_setting(setting_name):
-    config = load_config()
-    if 'panel' in config and setting_name in config['panel']:
-        del config['panel'][setting_name]
-        save_config(config)
-        await flash(f'Setting "{setting_name}" deleted!', 'success')
-    return redirect(url_for('panel_settings'))
+    def delete_setting(config):
+        if 'panel' in config and setting_name in config['panel']:
+            del config['panel'][setting_name]
+            return True
+        return False
+
+    if await update_config(delete_setting):
+        return await respond(url_for('panel_settings'), f'Setting "{setting_name}" deleted!')
+    return await respond(url_for('panel_settings'), f'Setting "{setting_name}" not found', 'error')
 
 # ======================
 # Dockbar Routes
@@ -298,28 +883,27 @@ async def delete_panel_setting(setting_name):
 
 
 @app.route('/dockbar')
+@conditional('dockbar')
 async def dockbar():
-    config = load_config()
-    return await render_template('dockbar.html', apps=config.get('dockbar', {}))
+    config = await aload_config()
+    return await render_listing('dockbar.html', 'dockbar_rows.html', config, 'dockbar')
 
 
 @app.route('/dockbar/add', methods=['GET', 'POST'])
 async def add_dockbar_app():
     if request.method == 'POST':
         form = await request.form
-        config = load_config()
 
         app_id = secure_filename(form['id'])
-        config.setdefault('dockbar', {})[app_id] = {
-            'cmd': form['cmd'],
-            'icon': form['icon'],
-            'wclass': form.get('wclass', ''),
-            'desktop_file': form.get('desktop_file', ''),
-            'name': form['name'],
-            **({'initial_title': form['initial_title']} if 'initial_title' in form else {})
-        }
-
-        save_config(config)
+        try:
+            new_app = DockbarApp.parse(form).to_toml()
+        except ValueError as e:
+            return await respond(url_for('add_dockbar_app'), str(e), 'error')
+
+        def add_app(config):
+            config.setdefault('dockbar', {})[app_id] = new_app
+
+        await update_config(add_app)
         return redirect(url_for('dockbar'))
 
     return await render_template('add_dockbar_app.html')
@@ -327,90 +911,126 @@ async def add_dockbar_app():
 
 @app.route('/dockbar/edit/<app_id>', methods=['GET', 'POST'])
 async def edit_dockbar_app(app_id):
-    config = load_config()
-
     if request.method == 'POST':
         form = await request.form
-        config['dockbar'][app_id] = {
-            'cmd': form['cmd'],
-            'icon': form['icon'],
-            'wclass': form.get('wclass', ''),
-            'desktop_file': form.get('desktop_file', ''),
-            'name': form['name'],
-            **({'initial_title': form['initial_title']} if 'initial_title' in form else {})
-        }
-        save_config(config)
+        try:
+            edited_app = DockbarApp.parse(form).to_toml()
+        except ValueError as e:
+            return await respond(url_for('edit_dockbar_app', app_id=app_id), str(e), 'error')
+
+        def edit_app(config):
+            config['dockbar'][app_id] = edited_app
+
+        await update_config(edit_app)
         return redirect(url_for('dockbar'))
 
+    config = await aload_config()
     app_config = config.get('dockbar', {}).get(app_id, {})
     return await render_template('edit_dockbar_app.html', app_id=app_id, app=app_config)
 
 
 @app.route('/dockbar/delete/<app_id>', methods=['POST'])
 async def delete_dockbar_app(app_id):
-    config = load_config()
-    if 'dockbar' in config and app_id in config['dockbar']:
-        del config['dockbar'][app_id]
-        save_config(config)
-    return redirect(url_for('dockbar'))
+    def delete_app(config):
+        if 'dockbar' in config and app_id in config['dockbar']:
+            del config['dockbar'][app_id]
+            return True
+        return False
+
+    if await update_config(delete_app):
+        return await respond(url_for('dockbar'), f'Deleted {app_id}')
+    return await respond(url_for('dockbar'), 'Application not found', 'error')
 
 
 @app.route('/dockbar/move_up/<app_name>', methods=['POST'])
 async def move_dockbar_app_up(app_name):
-    try:
-        config = load_config()
-        dockbar_items = config.get('dockbar', {})
-
-        if app_name not in dockbar_items:
-            await flash('Application not found', 'error')
-            return redirect(url_for('dockbar'))
-
-        items_list = list(dockbar_items.items())
-        current_index = next(i for i, (k, v) in enumerate(items_list) if k == app_name)
-
-        if current_index <= 0:
-            await flash('Already at top', 'info')
-            return redirect(url_for('dockbar'))
-
-        prev_index = current_index - 1
-        items_list[current_index], items_list[prev_index] = items_list[prev_index], items_list[current_index]
-        config['dockbar'] = dict(items_list)
-        save_config(config)
-        await flash(f'Moved {app_name} up', 'success')
+    def move_up(config):
+        order = DockOrder(config.get('dockbar', {}))
+        if app_name not in order:
+            return 'missing'
+        position = order.position(app_name)
+        if position == 0:
+            return 'top'
+        order.move(app_name, position - 1)
+        order.apply(config)
+        return 'moved'
 
+    try:
+        result = await update_config(move_up)
     except Exception as e:
-        await flash('Error moving application', 'error')
+        return await respond(url_for('dockbar'), 'Error moving application', 'error')
 
-    return redirect(url_for('dockbar'))
+    if result == 'missing':
+        return await respond(url_for('dockbar'), 'Application not found', 'error')
+    if result == 'top':
+        return await respond(url_for('dockbar'), 'Already at top', 'info')
+    return await respond(url_for('dockbar'), f'Moved {app_name} up', moved='up')
 
 
 @app.route('/dockbar/move_down/<app_name>', methods=['POST'])
 async def move_dockbar_app_down(app_name):
+    def move_down(config):
+        order = DockOrder(config.get('dockbar', {}))
+        if app_name not in order:
+            return 'missing'
+        position = order.position(app_name)
+        if position >= len(order) - 1:
+            return 'bottom'
+        order.move(app_name, position + 1)
+        order.apply(config)
+        return 'moved'
+
     try:
-        config = load_config()
-        dockbar_items = config.get('dockbar', {})
+        result = await update_config(move_down)
+    except Exception as e:
+        return await respond(url_for('dockbar'), 'Error moving application', 'error')
 
-        if app_name not in dockbar_items:
-            await flash('Application not found', 'error')
-            return redirect(url_for('dockbar'))
+    if result == 'missing':
+        return await respond(url_for('dockbar'), 'Application not found', 'error')
+    if result == 'bottom':
+        return await respond(url_for('dockbar'), 'Already at bottom', 'info')
+    return await respond(url_for('dockbar'), f'Moved {app_name} down', moved='down')
 
-        items_list = list(dockbar_items.items())
-        current_index = next(i for i, (k, v) in enumerate(items_list) if k == app_name)
 
-        if current_index >= len(items_list) - 1:
-            await flash('Already at bottom', 'info')
-            return redirect(url_for('dockbar'))
+@app.route('/dockbar/reorder', methods=['POST'])
+async def reorder_dockbar():
+    """
+    Reorder the dock with a single save. Takes JSON or form data with either
+    ``order``, a list of app ids (apps left out keep their relative order
+    after the listed ones), or ``app`` and ``position`` to move one app.
+    """
+    data = await request.get_json(silent=True)
+    if data is None:
+        form = await request.form
+        data = {'order': form.getlist('order')} if 'order' in form else form.to_dict()
 
-        next_index = current_index + 1
-        items_list[current_index], items_list[next_index] = items_list[next_index], items_list[current_index]
-        config['dockbar'] = dict(items_list)
-        save_config(config)
-        await flash(f'Moved {app_name} down', 'success')
+    if isinstance(data.get('order'), list):
+        names = [str(name) for name in data['order']]
+        position = None
+    elif 'app' in data and 'position' in data:
+        try:
+            position = int(data['position'])
+        except (TypeError, ValueError):
+            return {'success': False, 'message': 'position must be an integer'}, 400
+    else:
+        return {'success': False, 'message': 'Expected "order" or "app" and "position"'}, 400
 
-    except Exception as e:
-        await flash('Error moving application', 'error')
+    def reorder(config):
+        order = DockOrder(config.get('dockbar', {}))
+        if position is None:
+            order.reorder(names)
+        else:
+            order.move(data['app'], position)
+        order.apply(config)
+        return order.names
 
-    return redirect(url_for('dockbar'))
+    try:
+        order = await update_config(reorder)
+    except KeyError as e:
+        return {'success': False, 'message': f'Application not found: {e.args[0]}'}, 404
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}, 400
+    return {'success': True, 'order': order}
 
 # ======================
 # Menu Routes
@@ -418,18 +1038,14 @@ async def move_dockbar_app_down(app_name):
 
 
 @app.route('/menu')
+@conditional('menu')
 async def menu():
-    config = load_config()
-    menu_config = config.get('menu', {})
-    return await render_template('menu/index.html',
-                                 menu_config=menu_config,
-                                 get_menu_items=get_menu_items)
+    config = await aload_config()
+    return await render_listing('menu/index.html', 'menu/index_rows.html', config, 'menu')
 
 
 @app.route('/menu/icons/edit', methods=['GET', 'POST'])
 async def edit_menu_icons():
-    config = load_config()
-
     if request.method == 'POST':
         form = await request.form
         icons = {}
@@ -447,81 +1063,98 @@ async def edit_menu_icons():
         if new_name and new_icon:
             icons[new_name] = new_icon
 
-        config.setdefault('menu', {})['icons'] = icons
-        save_config(config)
+        def replace_icons(config):
+            config.setdefault('menu', {})['icons'] = icons
+
+        await update_config(replace_icons)
         await flash('Menu icons updated!', 'success')
         return redirect(url_for('menu'))
 
+    config = await aload_config()
     menu_icons = config.get('menu', {}).get('icons', {})
     return await render_template('menu/icons.html', menu_icons=menu_icons)
 
 
 @app.route('/menu/submenu/<submenu_name>')
+@conditional('menu')
 async def view_submenu(submenu_name):
-    config = load_config()
-    submenu_data = config.get('menu', {}).get(submenu_name, {})
-
-    items = []
-    if isinstance(submenu_data, list):
-        items = submenu_data
-    elif isinstance(submenu_data, dict):
-        items = []
-        for key, item in submenu_data.items():
-            if key.startswith('item'):
-                if isinstance(item, dict):
-                    items.append({
-                        'name': item.get('name'),
-                        'cmd': item.get('cmd'),
-                        'key': key
-                    })
-
-    return await render_template('menu/submenu.html',
-                                 submenu_name=submenu_name,
-                                 items=items)
+    config = await aload_config()
+    return await render_listing('menu/submenu.html', 'menu/submenu_rows.html', config,
+                                ('menu', submenu_name), submenu_name=submenu_name)
 
 
 @app.route('/menu/submenu/<submenu_name>/add', methods=['GET', 'POST'])
 async def add_submenu_item(submenu_name):
-    config = load_config()
-
     if request.method == 'POST':
         form = await request.form
-        new_item = {'name': form['name'], 'cmd': form['cmd']}
+        try:
+            new_item = MenuItem.parse(form).to_toml()
+        except ValueError as e:
+            return await respond(url_for('add_submenu_item', submenu_name=submenu_name), str(e), 'error')
 
-        if 'menu' not in config:
-            config['menu'] = {}
-        if submenu_name not in config['menu']:
-            config['menu'][submenu_name] = {}
+        def add_item(config):
+            if 'menu' not in config:
+                config['menu'] = {}
+            if submenu_name not in config['menu']:
+                config['menu'][submenu_name] = {}
 
-        item_num = 1
-        while f'item_{item_num}' in config['menu'][submenu_name]:
-            item_num += 1
+            submenu = config['menu'][submenu_name]
+            key, = submenu_items(submenu_name, submenu).allocate()
+            submenu[key] = new_item
 
-        config['menu'][submenu_name][f'item_{item_num}'] = new_item
-        save_config(config)
+        await update_config(add_item)
         await flash('Item added successfully!', 'success')
         return redirect(url_for('view_submenu', submenu_name=submenu_name))
 
     return await render_template('menu/add_item.html', submenu_name=submenu_name)
 
 
+@app.route('/menu/submenu/<submenu_name>/items', methods=['POST'])
+async def append_submenu_items(submenu_name):
+    """
+    Append many items in one save. Takes JSON like
+    ``{"items": [{"name": ..., "cmd": ...}, ...]}`` and returns the new keys.
+    """
+    data = await request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return {'success': False, 'message': 'Expected "items", a list of {"name", "cmd"} objects'}, 400
+    try:
+        new_items = [MenuItem.parse(item).to_toml() for item in items]
+    except ValueError as e:
+        return {'success': False, 'message': f'Invalid item: {e}'}, 400
+
+    def append_items(config):
+        submenu = config.setdefault('menu', {}).setdefault(submenu_name, {})
+        if not isinstance(submenu, dict):
+            return None
+        keys = submenu_items(submenu_name, submenu).allocate(len(new_items))
+        for key, item in zip(keys, new_items):
+            submenu[key] = item
+        return keys
+
+    keys = await update_config(append_items)
+    if keys is None:
+        return {'success': False, 'message': f'Submenu "{submenu_name}" is not a table of items'}, 400
+    return {'success': True, 'keys': keys}
+
+
 @app.route('/menu/submenu/<submenu_name>/delete', methods=['POST'])
 async def delete_submenu(submenu_name):
-    config = load_config()
-
-    if 'menu' in config and submenu_name in config['menu']:
-        del config['menu'][submenu_name]
-        save_config(config)
-        await flash(f'Submenu "{submenu_name}" deleted successfully!', 'success')
-    else:
-        await flash(f'Submenu "{submenu_name}" not found!', 'error')
+    def delete(config):
+        if 'menu' in config and submenu_name in config['menu']:
+            del config['menu'][submenu_name]
+            return True
+        return False
 
-    return redirect(url_for('menu'))
+    if await update_config(delete):
+        return await respond(url_for('menu'), f'Submenu "{submenu_name}" deleted successfully!')
+    return await respond(url_for('menu'), f'Submenu "{submenu_name}" not found!', 'error')
 
 
 @app.route('/menu/submenu/<submenu_name>/edit/<int:item_num>', methods=['GET', 'POST'])
 async def edit_submenu_item(submenu_name, item_num):
-    config = load_config()
+    config = await aload_config()
     item_key = f'item_{item_num}'
     submenu_data = config.get('menu', {}).get(submenu_name, {})
 
@@ -531,11 +1164,18 @@ async def edit_submenu_item(submenu_name, item_num):
 
     if request.method == 'POST':
         form = await request.form
-        submenu_data[item_key] = {
-            'name': form['name'],
-            'cmd': form['cmd']
-        }
-        save_config(config)
+        try:
+            edited_item = MenuItem.parse(form).to_toml()
+        except ValueError as e:
+            location = url_for('edit_submenu_item', submenu_name=submenu_name, item_num=item_num)
+            return await respond(location, str(e), 'error')
+
+        def edit_item(config):
+            submenu = config.get('menu', {}).get(submenu_name, {})
+            if item_key in submenu:
+                submenu[item_key] = edited_item
+
+        await update_config(edit_item)
         await flash('Item updated!', 'success')
         return redirect(url_for('view_submenu', submenu_name=submenu_name))
 
@@ -547,22 +1187,23 @@ async def edit_submenu_item(submenu_name, item_num):
 
 @app.route('/menu/submenu/<submenu_name>/delete/<int:item_num>', methods=['POST'])
 async def delete_submenu_item(submenu_name, item_num):
-    config = load_config()
     item_key = f'item_{item_num}'
 
-    if 'menu' in config and submenu_name in config['menu'] and item_key in config['menu'][submenu_name]:
-        item_name = config['menu'][submenu_name][item_key].get('name', 'Unnamed item')
-        del config['menu'][submenu_name][item_key]
-
-        if not config['menu'][submenu_name]:
-            del config['menu'][submenu_name]
+    def delete_item(config):
+        if 'menu' in config and submenu_name in config['menu'] and item_key in config['menu'][submenu_name]:
+            item_name = config['menu'][submenu_name][item_key].get('name', 'Unnamed item')
+            del config['menu'][submenu_name][item_key]
 
-        save_config(config)
-        await flash(f'Deleted item "{item_name}" from {submenu_name}', 'success')
-    else:
-        await flash('Item not found!', 'error')
+            if not config['menu'][submenu_name]:
+                del config['menu'][submenu_name]
+            return item_name
+        return None
 
-    return redirect(url_for('view_submenu', submenu_name=submenu_name))
+    item_name = await update_config(delete_item)
+    location = url_for('view_submenu', submenu_name=submenu_name)
+    if item_name is not None:
+        return await respond(location, f'Deleted item "{item_name}" from {submenu_name}')
+    return await respond(location, 'Item not found!', 'error')
 
 
 @app.route('/menu/submenu/add', methods=['GET', 'POST'])
@@ -571,12 +1212,15 @@ async def add_submenu():
         form = await request.form
         submenu_name = secure_filename(form['name'])
 
-        config = load_config()
-        if 'menu' not in config:
-            config['menu'] = {}
-        if submenu_name not in config['menu']:
-            config['menu'][submenu_name] = {}
-            save_config(config)
+        def add(config):
+            if 'menu' not in config:
+                config['menu'] = {}
+            if submenu_name not in config['menu']:
+                config['menu'][submenu_name] = {}
+                return True
+            return False
+
+        if await update_config(add):
             await flash('Submenu created!', 'success')
             return redirect(url_for('view_submenu', submenu_name=submenu_name))
 
@@ -588,26 +1232,27 @@ async def add_submenu():
 
 
 @app.route('/folders')
+@conditional('folders')
 async def folders():
-    config = load_config()
-    return await render_template('folders/index.html', folders=config.get('folders', {}))
+    config = await aload_config()
+    return await render_listing('folders/index.html', 'folders/rows.html', config, 'folders')
 
 
 @app.route('/folders/add', methods=['GET', 'POST'])
 async def add_folder():
     if request.method == 'POST':
         form = await request.form
-        config = load_config()
 
         folder_id = secure_filename(form['id'])
-        config.setdefault('folders', {})[folder_id] = {
-            'name': form['name'],
-            'path': form['path'],
-            'filemanager': form['filemanager'],
-            'icon': form['icon']
-        }
-
-        save_config(config)
+        try:
+            new_folder = FolderEntry.parse(form).to_toml()
+        except ValueError as e:
+            return await respond(url_for('add_folder'), str(e), 'error')
+
+        def add(config):
+            config.setdefault('folders', {})[folder_id] = new_folder
+
+        await update_config(add)
         await flash('Folder added!', 'success')
         return redirect(url_for('folders'))
 
@@ -616,43 +1261,395 @@ async def add_folder():
 
 @app.route('/folders/edit/<folder_id>', methods=['GET', 'POST'])
 async def edit_folder(folder_id):
-    config = load_config()
-
     if request.method == 'POST':
         form = await request.form
-        config['folders'][folder_id] = {
-            'name': form['name'],
-            'path': form['path'],
-            'filemanager': form['filemanager'],
-            'icon': form['icon']
-        }
-        save_config(config)
+        try:
+            edited_folder = FolderEntry.parse(form).to_toml()
+        except ValueError as e:
+            return await respond(url_for('edit_folder', folder_id=folder_id), str(e), 'error')
+
+        def edit(config):
+            config['folders'][folder_id] = edited_folder
+
+        await update_config(edit)
         await flash('Folder updated!', 'success')
         return redirect(url_for('folders'))
 
+    config = await aload_config()
     folder = config.get('folders', {}).get(folder_id, {})
     return await render_template('folders/edit.html', folder_id=folder_id, folder=folder)
 
 
 @app.route('/folders/delete/<folder_id>', methods=['POST'])
 async def delete_folder(folder_id):
-    config = load_config()
-    if 'folders' in config and folder_id in config['folders']:
-        del config['folders'][folder_id]
-        save_config(config)
-        await flash('Folder deleted!', 'success')
-    return redirect(url_for('folders'))
+    def delete(config):
+        if 'folders' in config and folder_id in config['folders']:
+            del config['folders'][folder_id]
+            return True
+        return False
+
+    if await update_config(delete):
+        return await respond(url_for('folders'), 'Folder deleted!')
+    return await respond(url_for('folders'), 'Folder not found', 'error')
+
+# ======================
+# Batch API
+# ======================
+
+
+@app.route('/api/batch', methods=['POST'])
+async def api_batch():
+    """
+    Apply a list of operations in one transaction and one save. Takes JSON
+    like ``{"operations": [{"op": "add", "section": "dockbar", "id": ...,
+    "value": {...}}, ...]}`` (see core.Batch). Either every operation is
+    applied or none is; the response has one result per operation.
+    """
+    data = await request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(operations, list):
+        return {'success': False, 'message': 'Expected "operations", a list of operation objects'}, 400
+
+    results = []
+
+    def run(config):
+        results.extend(apply_batch(config, operations))
+
+    try:
+        await update_config(run, offload=True)
+    except BatchError as e:
+        # Nothing was kept; report how far the batch got
+        results = [{'status': 'ok'} for _ in range(e.index)]
+        results.append({'status': 'error', 'message': str(e)})
+        results.extend({'status': 'skipped'} for _ in range(len(operations) - e.index - 1))
+        return {'success': False, 'failed': e.index, 'message': f'Operation {e.index}: {e}',
+                'results': results}, 400
+    error = await save_now()
+    if error:
+        return {'success': False, 'message': error}, 500
+    return {'success': True, 'results': [{'status': 'ok', **result} for result in results]}
+
+# ======================
+# Import / Export API
+# ======================
+
+TRANSFER_MIMETYPES = {'jsonl': 'application/x-ndjson', 'toml': 'application/toml'}
+
+
+def transfer_args():
+    """(format, sections, replace) from ?format=, ?section= and ?replace="""
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in TRANSFER_FORMATS:
+        raise TransferError(f'Unknown format {fmt!r}, expected one of {", ".join(TRANSFER_FORMATS)}')
+    sections = tuple(request.args.getlist('section')) or TRANSFER_SECTIONS
+    replace = tuple(request.args.getlist('replace'))
+    unknown = [name for name in sections + replace if name not in TRANSFER_SECTIONS]
+    if unknown:
+        raise TransferError(f'Unknown section {unknown[0]!r}, expected one of {", ".join(TRANSFER_SECTIONS)}')
+    # Replacing a section imports it
+    sections += tuple(name for name in replace if name not in sections)
+    return fmt, sections, replace
+
+
+@app.route('/api/export')
+async def api_export():
+    """
+    Stream the dockbar apps, folders and menu items (or the ?section=s
+    given) as JSON Lines, or as TOML tables with ?format=toml
+    """
+    try:
+        fmt, sections, _ = transfer_args()
+    except TransferError as e:
+        return {'success': False, 'message': str(e)}, 400
+    config = await aload_config()
+    parts = dump_entries(config_entries(config, sections), fmt)
+
+    async def stream():
+        chunk, size = [], 0
+        for part in parts:
+            chunk.append(part)
+            size += len(part)
+            if size >= app.config['EXPORT_CHUNK_SIZE']:
+                yield ''.join(chunk).encode()
+                chunk, size = [], 0
+        if chunk:
+            yield ''.join(chunk).encode()
+
+    response = Response(stream(), mimetype=TRANSFER_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=waypanel-{"-".join(sections)}.{fmt}'
+    return response
+
+
+@app.route('/api/import', methods=['POST'])
+async def api_import():
+    """
+    Import the entries in the request body, in either /api/export format.
+    Entries are parsed, checked and merged into their sections as the body
+    streams in, and saved in one go; each ?replace= section is replaced
+    instead. Nothing is saved if any entry is invalid.
+    """
+    try:
+        fmt, sections, replace = transfer_args()
+    except TransferError as e:
+        return {'success': False, 'message': str(e)}, 400
+
+    async def import_body(config):
+        reader = EntryReader(fmt, sections)
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        counts = await run_io(import_entries, config, (), replace)
+
+        def merge(chunk, final=False):
+            # One chunk's entries at a time, like the CLI reading a file
+            entries = reader.feed(decoder.decode(chunk, final))
+            if final:
+                entries += reader.close()
+            for name, count in import_entries(config, entries).items():
+                counts[name] += count
+
+        async for chunk in request.body:
+            await run_io(merge, chunk)
+        await run_io(merge, b'', True)
+        return counts
+
+    try:
+        counts = await update_config(import_body)
+    except (TransferError, UnicodeDecodeError) as e:
+        return {'success': False, 'message': str(e)}, 400
+    error = await save_now()
+    if error:
+        return {'success': False, 'message': error}, 500
+    return {'success': True, 'imported': {name: counts[name] for name in sections}}
+
+# ======================
+# History Routes
+# ======================
+
+
+@app.route('/history')
+async def config_history():
+    versions = await run_io(history.versions, app.config['CONFIG_PATH'])
+    return await render_template('history/index.html', versions=versions[::-1],
+                                 head=versions[-1]['version'] if versions else None,
+                                 enabled=history.ENABLED)
+
+
+@app.route('/history/<int:version>')
+async def history_version(version):
+    try:
+        delta = await run_io(history.version_delta, app.config['CONFIG_PATH'], version)
+    except KeyError:
+        abort(404)
+    return await render_template('history/version.html', version=version, delta=delta)
+
+
+@app.route('/history/<int:version>/rollback', methods=['POST'])
+async def rollback_version(version):
+    """Restore the config as it was at version; the rollback is itself a new version"""
+    try:
+        target = await run_io(history.version_config, app.config['CONFIG_PATH'], version)
+    except (KeyError, OSError, ValueError) as e:
+        return await respond(url_for('config_history'), f'Version {version} can\'t be restored: {e}', 'error')
+
+    def restore(config):
+        for name in [name for name in config if name not in target]:
+            del config[name]
+        for name, table in target.items():
+            # Only replace tables that differ, so the rest of the file is kept verbatim
+            if name not in config or not same_config(dict.__getitem__(config, name), table):
+                config[name] = table
+
+    await update_config(restore)
+    error = await save_now()
+    if error:
+        response = await respond(url_for('config_history'), error, 'error')
+        return (response, 500) if wants_json() else response
+    return await respond(url_for('config_history'), f'Rolled back to version {version}')
+
+# ======================
+# Diff API
+# ======================
+
+
+@app.route('/api/diff', methods=['GET', 'POST'])
+async def api_diff():
+    """
+    What a save would change. GET diffs the edits still waiting to be
+    written against the file. POST diffs against the current config either
+    ``{"operations": [...]}``, a batch as taken by /api/batch (nothing is
+    applied), or ``{"config": {...}}``, a whole proposed config.
+    """
+    if request.method == 'GET':
+        current = await run_io(read_config, app.config['CONFIG_PATH'])
+        proposed = await aload_config()
+    else:
+        data = await request.get_json(silent=True)
+        current = await aload_config()
+        if isinstance(data, dict) and isinstance(data.get('operations'), list):
+            def preview(operations):
+                # A layer of its own: its submenus number items from private
+                # copies of their indexes, so nothing shared sees the preview
+                proposed = ConfigView(current, dirty=set())
+                apply_batch(proposed, operations)
+                return proposed
+
+            try:
+                proposed = await run_io(preview, data['operations'])
+            except BatchError as e:
+                return {'success': False, 'failed': e.index, 'message': f'Operation {e.index}: {e}'}, 400
+        elif isinstance(data, dict) and isinstance(data.get('config'), dict):
+            proposed = data['config']
+        else:
+            return {'success': False, 'message': 'Expected "operations" or "config"'}, 400
+
+    diff = await run_io(diff_configs, current, proposed)
+    return {'success': True, 'changes': sum(map(len, diff.values())), **diff}
+
+# ======================
+# Live Updates
+# ======================
+
+
+class ConfigEvents:
+    """
+    Pushes config file changes to open pages over Server-Sent Events.
+
+    The config cache's inotify watcher reports changes; a burst of events
+    within EVENTS_DELAY is coalesced, the file is parsed once and its
+    per-table hashes are compared with the last published ones. Only the
+    tables that changed are sent, serialized once for every connected page.
+    The app's own saves only move the baseline; they aren't news to anyone.
+    """
+
+    def __init__(self, queue_size=16):
+        self.queue_size = queue_size
+        self.loop = None
+        self.clients = set()
+        self.hashes = None
+        self.version = 0
+        self.task = None
+        self.listening = False
+
+    async def subscribe(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop, self.clients, self.task = loop, set(), None
+        if not self.listening:
+            _config_cache.add_listener(self.on_change)
+            self.listening = True
+        if self.hashes is None:
+            config = await run_io(read_config, app.config['CONFIG_PATH'])
+            self.hashes = await run_io(section_hashes, config)
+        queue = asyncio.Queue(self.queue_size)
+        self.clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.clients.discard(queue)
+        if not self.clients:
+            # Nobody to diff for; the next subscriber starts from a fresh baseline
+            self.hashes = None
+
+    def on_change(self, path):
+        """Called from the watcher thread"""
+        if path != app.config['CONFIG_PATH'] or self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._schedule)
+        except RuntimeError:
+            # The loop has closed
+            pass
+
+    def _schedule(self):
+        if self.clients and self.task is None:
+            self.task = self.loop.create_task(self._publish())
+
+    async def _publish(self):
+        await asyncio.sleep(app.config['EVENTS_DELAY'])
+        self.task = None
+        if not self.clients or self.hashes is None:
+            return
+        try:
+            config = await run_io(read_config, app.config['CONFIG_PATH'])
+        except toml_codec.TOMLDecodeError:
+            # Caught mid-edit; the write that fixes it triggers another event
+            return
+        hashes = await run_io(section_hashes, config)
+        changed = [name for name, digest in hashes.items() if self.hashes.get(name) != digest]
+        removed = [name for name in self.hashes if name not in hashes]
+        if not changed and not removed:
+            return
+        self.hashes = hashes
+        if await run_io(_config_cache.own_write, app.config['CONFIG_PATH']):
+            # Saved by this app: the page that made the edit already shows it
+            return
+        self.version += 1
+        mtime = await run_io(_last_modified, app.config['CONFIG_PATH'])
+        self.broadcast({'version': self.version,
+                        'changed': {name: dict.get(config, name) for name in changed},
+                        'removed': removed,
+                        'last_modified': mtime})
+
+    def broadcast(self, event):
+        data = json.dumps(event, default=str)
+        resync = None
+        for queue in self.clients:
+            if queue.full():
+                # A page that stopped reading only learns that it must resync
+                while not queue.empty():
+                    queue.get_nowait()
+                resync = resync or json.dumps({'version': event['version'], 'changed': {},
+                                               'removed': [], 'resync': True})
+                queue.put_nowait(resync)
+            else:
+                queue.put_nowait(data)
+
+
+_config_events = ConfigEvents()
+
+
+@app.route('/api/events')
+async def config_events():
+    """Server-Sent Events stream of ``config`` events, one per file change"""
+    queue = await _config_events.subscribe()
+
+    async def stream():
+        try:
+            yield f'retry: 2000\nevent: hello\ndata: {_config_events.version}\n\n'.encode()
+            while True:
+                try:
+                    data = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Keeps proxies and the webview from dropping an idle stream
+                    yield b': keepalive\n\n'
+                    continue
+                yield f'event: config\ndata: {data}\n\n'.encode()
+        finally:
+            _config_events.unsubscribe(queue)
+
+    response = await make_response(stream(), {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.timeout = None
+    return response
 
 # ======================
 # Main Route
 # ======================
 
 
+def _last_modified(config_path):
+    mtime = _config_cache.mtime(config_path)
+    return time.ctime(mtime) if mtime is not None else "Never"
+
+
 @app.route('/')
+@conditional()
 async def index():
-    config = load_config()
+    config = await aload_config()
     config_path = app.config['CONFIG_PATH']
-    last_modified = time.ctime(os.path.getmtime(config_path)) if os.path.exists(config_path) else "Never"
+    last_modified = await run_io(_last_modified, config_path)
     return await render_template(
         'index.html',
         config=config,
@@ -662,11 +1659,18 @@ async def index():
 
 
 class WebViewManager:
-    def __init__(self, quart_app):
+    def __init__(self, quart_app, host='127.0.0.1', port=5001, timer=None):
         self.quart_app = quart_app
+        self.host = host
+        self.port = port
+        self.timer = timer
         self.server_task = None
+        self.server_error = None
         self.window = None
         self.shutdown_event = asyncio.Event()
+        # Set by the server thread once the app is serving on the bound socket
+        self.ready = threading.Event()
+        self.quart_app.before_serving(self.on_serving)
         self.setup_logging()
 
     def setup_logging(self):
@@ -678,11 +1682,29 @@ class WebViewManager:
         self.logger = logging.getLogger('WebViewManager')
         self.logger.info("Logging initialized")
 
-    async def run_server(self):
+    async def on_serving(self):
+        self.ready.set()
+
+    def bind_socket(self):
+        """
+        Bind and listen before the server thread starts, so the window's first
+        request queues in the backlog instead of racing the server start.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((self.host, self.port))
+            sock.listen(socket.SOMAXCONN)
+        except OSError:
+            sock.close()
+            raise
+        return sock.detach()
+
+    async def run_server(self, fd):
         try:
             self.logger.debug("Starting server...")
             config = Config()
-            config.bind = ["127.0.0.1:5001"]
+            config.bind = [f"fd://{fd}"]
             config.use_reloader = False
             config.accesslog = "-"
             config.errorlog = "-"
@@ -691,12 +1713,13 @@ class WebViewManager:
             self.logger.error(f"Server error: {str(e)}")
             raise
 
-    def start_server(self):
+    def start_server(self, fd):
         try:
             self.logger.info("Creating new event loop")
             asyncio.set_event_loop(asyncio.new_event_loop())
             loop = asyncio.get_event_loop()
-            self.server_task = loop.create_task(self.run_server())
+            self.server_task = loop.create_task(self.run_server(fd))
+            self.server_task.add_done_callback(self.on_server_done)
             self.logger.info("Starting event loop")
             loop.run_forever()
         except Exception as e:
@@ -706,18 +1729,34 @@ class WebViewManager:
             self.logger.info("Closing event loop")
             loop.close()
 
-    def start(self):
+    def on_server_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.server_error = task.exception()
+        # Don't leave start() waiting on a server that is gone
+        self.ready.set()
+
+    def start(self, startup_timeout=10):
         self.logger.info("Starting WebView manager")
-        t = threading.Thread(target=self.start_server, daemon=True)
+        fd = self.bind_socket()
+        t = threading.Thread(target=self.start_server, args=(fd,), daemon=True)
         t.start()
         self.logger.debug("Server thread started")
-        time.sleep(1)
+
+        if not self.ready.wait(startup_timeout):
+            raise RuntimeError(f"Server did not start within {startup_timeout}s")
+        if self.server_error is not None:
+            raise self.server_error
+        if self.timer:
+            self.timer.mark('server bind')
 
         try:
+            # Deferred so the headless CLI never pays for the GUI toolkit
+            import webview
+
             self.logger.debug("Creating WebView window")
             self.window = webview.create_window(
                 'Waypanel Settings',
-                'http://127.0.0.1:5001',
+                f'http://{self.host}:{self.port}',
                 width=1200,
                 height=800,
                 min_size=(800, 600)
@@ -729,7 +1768,13 @@ class WebViewManager:
                 if self.server_task:
                     self.server_task.cancel()
 
+            def on_loaded():
+                if self.timer and not any(label == 'first paint' for label, _ in self.timer.marks):
+                    self.timer.mark('first paint')
+                    self.timer.report()
+
             self.window.events.closed += on_closed
+            self.window.events.loaded += on_loaded
             self.logger.info("Starting WebView")
             webview.start()
         except Exception as e:
@@ -737,26 +1782,29 @@ class WebViewManager:
             raise
 
 
-def main():
+def main(timer=None):
+    """Run the settings window; the CLI in cli.py parses arguments"""
+    if timer:
+        timer.mark('import')
+
     logging.basicConfig(level=logging.DEBUG)
     logger = logging.getLogger(__name__)
 
     try:
         logger.info("Loading configuration")
-        config = load_config()
-        save_config(config)
+        # Warms the config cache; the file is only rewritten if cleanup removed something
+        for name in clean_config(app.config['CONFIG_PATH']):
+            logger.info(f"Removed empty orphaned section: [{name}]")
+        if timer:
+            timer.mark('config load/clean')
 
         logger.info("Setting up signal handlers")
         signal.signal(signal.SIGINT, signal.SIG_DFL)
         signal.signal(signal.SIGTERM, signal.SIG_DFL)
 
         logger.info("Starting WebView manager")
-        manager = WebViewManager(app)
+        manager = WebViewManager(app, timer=timer)
         manager.start()
     except Exception as e:
         logger.error(f"Fatal error: {str(e)}")
         raise
-
-
-if __name__ == '__main__':
-    main()